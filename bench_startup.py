@@ -0,0 +1,138 @@
+"""
+Замер времени запуска бота.
+
+Каждый замер выполняется в отдельном свежем процессе Python:
+  * импорт bot.py — сколько стоит загрузка модулей;
+  * время до первого ответа — от старта процесса до ответа обработчика /info
+    (с предварительной загрузкой данных, как в bot.main), затем /top.
+Сеть не используется: ответы берутся из локального набора стран, Telegram
+заменён поддельным сообщением.
+
+Запуск: python bench_startup.py [--runs 5] [--output bench_output.txt]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Код дочернего процесса: печатает в stderr строку "BENCH <JSON>" с отметками времени
+# в секундах от старта процесса (stdout занят логами бота)
+_CHILD_IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import bot
+print("BENCH " + json.dumps({"import": time.perf_counter() - started}), file=sys.stderr)
+"""
+
+_CHILD_FIRST_RESPONSE = """
+import json, sys, threading, time
+started = time.perf_counter()
+from types import SimpleNamespace
+
+import bot
+from telegram.ext import Updater
+from services.restcountries import start_warm_up
+
+marks = {"import": time.perf_counter() - started}
+replies = []
+
+class Message:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.sent = threading.Event()
+
+    def reply_text(self, text, **kwargs):
+        replies.append(time.perf_counter() - started)
+        self.sent.set()
+
+def call(handler, args, chat_id):
+    # Ответы уходят через очередь отправки: ждём, пока ответ действительно будет отправлен
+    message = Message(chat_id)
+    update = SimpleNamespace(message=message, effective_user=SimpleNamespace(id=chat_id))
+    handler(update, SimpleNamespace(args=args, user_data={}))
+    if not message.sent.wait(30):
+        raise RuntimeError("Ответ не отправлен")
+
+start_warm_up()
+Updater(bot.BOT_TOKEN, use_context=True)
+marks["updater"] = time.perf_counter() - started
+
+call(bot.info_cmd, ["France"], 1)
+marks["first_info"] = replies[-1]
+call(bot.top_cmd, ["population", "10"], 2)
+marks["first_top"] = replies[-1]
+print("BENCH " + json.dumps(marks), file=sys.stderr)
+"""
+
+
+def run_child(code: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench-token")
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    for line in result.stderr.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise RuntimeError(f"Дочерний процесс не вернул результат:\n{result.stderr}")
+
+
+def heaviest_imports(limit: int = 10) -> list:
+    """Самые тяжёлые модули по накопленному времени импорта (python -X importtime)."""
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench-token")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # Формат строки: "import time: <собственное> | <накопленное> | <модуль>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def summarize(samples: list) -> str:
+    ms = [s * 1000 for s in samples]
+    return f"медиана {statistics.median(ms):7.1f} мс, мин {min(ms):7.1f} мс, макс {max(ms):7.1f} мс"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска бота")
+    parser.add_argument("--runs", type=int, default=5, help="число запусков на каждый замер")
+    parser.add_argument("--output", help="дополнительно записать отчёт в файл")
+    args = parser.parse_args()
+
+    lines = [f"Python {sys.version.split()[0]}, запусков: {args.runs}", ""]
+
+    imports = [run_child(_CHILD_IMPORT)["import"] for _ in range(args.runs)]
+    lines.append(f"Импорт bot.py:            {summarize(imports)}")
+
+    runs = [run_child(_CHILD_FIRST_RESPONSE) for _ in range(args.runs)]
+    for key, title in (("updater", "Создание Updater:        "),
+                       ("first_info", "Первый ответ /info:      "),
+                       ("first_top", "Первый ответ /top:       ")):
+        lines.append(f"{title} {summarize([r[key] for r in runs])}")
+
+    lines += ["", "Самые тяжёлые импорты (накопленное время):"]
+    for cumulative_us, name in heaviest_imports():
+        lines.append(f"  {cumulative_us / 1000:8.1f} мс  {name}")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
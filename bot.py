@@ -1,6 +1,12 @@
 import logging
+import os
+import secrets
 import sys
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+from functools import partial
+from queue import Queue
+from telegram import Bot, Update
+from telegram.ext import Updater, Dispatcher, CommandHandler, MessageHandler, TypeHandler, Filters
+from telegram.utils.request import Request
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -14,7 +20,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 try:
-    from config import BOT_TOKEN
+    from config import (
+        BOT_TOKEN, COUNTRIES_REFRESH_INTERVAL, COUNTRIES_DATA_TTL,
+        BOT_MODE, ASYNC_BLOCKING_WORKERS,
+        SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_GROUP_RATE, SEND_WORKERS,
+        UPDATES_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET,
+        TELEGRAM_API_URL, BOT_WORKERS, PREFS_BACKEND, CACHE_BACKEND,
+        LANE_FAST_WORKERS, LANE_FAST_QUEUE, LANE_FAST_TIMEOUT,
+        LANE_LOOKUP_WORKERS, LANE_LOOKUP_QUEUE, LANE_LOOKUP_TIMEOUT,
+        LANE_HEAVY_WORKERS, LANE_HEAVY_QUEUE, LANE_HEAVY_TIMEOUT
+    )
 except ImportError:
     logger.error("Ошибка загрузки конфигурации")
     sys.exit(1)
@@ -23,14 +38,135 @@ try:
     from handlers.commands import (
         start, help_cmd, info_cmd, compare_cmd,
         top_cmd, setpref_cmd, myprefs_cmd, handle_text,
-        random_cmd
+        random_cmd, MAIN_KEYBOARD_BUTTONS
     )
     from handlers.errors import error_handler
+    from handlers.throttle import throttle_updates
+    from services.restcountries import (
+        start_background_refresh, configure_api_response_store, start_warm_up,
+        follow_shared_dataset, close_api_response_store, flush_dataset_writes, get_api_stats
+    )
+    from services.aio import runtime
+    from services.cache import create_cache_manager
+    from services.lanes import lane_router
+    from services.send_queue import send_queue
+    from services.webhook import start_webhook
+    from services.workers import WorkerPool
 except ImportError as e:
     logger.error(f"Ошибка загрузки обработчиков: {e}")
     sys.exit(1)
 
 
+def register_async_handlers(dispatcher):
+    """Регистрирует асинхронные обработчики (BOT_MODE=asyncio)."""
+    from handlers import async_commands
+    from services.restcountries import async_api_client
+
+    runtime.blocking_workers = ASYNC_BLOCKING_WORKERS
+    runtime.on_stop(async_api_client.close)
+    runtime.start()
+
+    wrap = async_commands.as_dispatcher_callback
+    dispatcher.add_handler(CommandHandler("start", start))
+    dispatcher.add_handler(CommandHandler("help", help_cmd))
+    dispatcher.add_handler(CommandHandler("info", wrap(async_commands.info_cmd)))
+    dispatcher.add_handler(CommandHandler("compare", wrap(async_commands.compare_cmd)))
+    dispatcher.add_handler(CommandHandler("top", wrap(async_commands.top_cmd)))
+    dispatcher.add_handler(CommandHandler("random", wrap(async_commands.random_cmd)))
+    dispatcher.add_handler(CommandHandler("setpref", wrap(async_commands.setpref_cmd)))
+    dispatcher.add_handler(CommandHandler("myprefs", wrap(async_commands.myprefs_cmd)))
+    dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, wrap(async_commands.handle_text)))
+
+
+# Полосы текстовых сообщений. Кнопки меню без аргументов отвечают мгновенно
+# (подсказка ввода, помощь, настройки, случайная страна) — полоса fast.
+# Ответ в диалоге выполняет ожидаемую команду и идёт в её полосу.
+WAITING_FOR_LANES = {
+    'country_info': "lookup",
+    'country_compare': "lookup",
+    'country_top': "heavy",
+}
+
+
+def text_lane(update: Update, context) -> str:
+    """Полоса для текстового сообщения (вызывается в потоке диспетчера)."""
+    if update.message.text in MAIN_KEYBOARD_BUTTONS:
+        return "fast"
+    return WAITING_FOR_LANES.get(context.user_data.get('waiting_for'), "fast")
+
+
+def register_handlers(dispatcher):
+    """Регистрирует обработчики команд и ошибок в диспетчере (в режиме BOT_MODE)."""
+    # Ограничение частоты запросов пользователя — до всех остальных обработчиков
+    dispatcher.add_handler(TypeHandler(Update, throttle_updates), group=-1)
+
+    if BOT_MODE == "asyncio":
+        logger.info("Режим обработки: asyncio")
+        register_async_handlers(dispatcher)
+    else:
+        # Поток диспетчера только ставит обработчик в полосу: /top и запросы к API
+        # не задерживают мгновенные команды
+        lane_router.add_lane("fast", LANE_FAST_WORKERS, LANE_FAST_QUEUE, LANE_FAST_TIMEOUT)
+        lane_router.add_lane("lookup", LANE_LOOKUP_WORKERS, LANE_LOOKUP_QUEUE, LANE_LOOKUP_TIMEOUT)
+        lane_router.add_lane("heavy", LANE_HEAVY_WORKERS, LANE_HEAVY_QUEUE, LANE_HEAVY_TIMEOUT)
+        fast = partial(lane_router.route, "fast")
+        lookup = partial(lane_router.route, "lookup")
+        heavy = partial(lane_router.route, "heavy")
+
+        dispatcher.add_handler(CommandHandler("start", fast(start)))
+        dispatcher.add_handler(CommandHandler("help", fast(help_cmd)))
+        dispatcher.add_handler(CommandHandler("info", lookup(info_cmd)))
+        dispatcher.add_handler(CommandHandler("compare", lookup(compare_cmd)))
+        dispatcher.add_handler(CommandHandler("top", heavy(top_cmd)))
+        dispatcher.add_handler(CommandHandler("random", fast(random_cmd)))
+        dispatcher.add_handler(CommandHandler("setpref", fast(setpref_cmd)))
+        dispatcher.add_handler(CommandHandler("myprefs", fast(myprefs_cmd)))
+        dispatcher.add_handler(MessageHandler(
+            Filters.text & ~Filters.command, lane_router.route_by(text_lane, handle_text)
+        ))
+
+    dispatcher.add_error_handler(error_handler)
+
+
+def start_send_queue(global_rate: float = SEND_GLOBAL_RATE):
+    send_queue.configure(
+        workers=SEND_WORKERS, global_rate=global_rate,
+        chat_rate=SEND_CHAT_RATE, group_rate=SEND_GROUP_RATE
+    )
+    send_queue.start()
+
+
+def setup_worker(index: int) -> Dispatcher:
+    """
+    Готовит рабочий процесс (BOT_WORKERS > 1): свой Bot и Dispatcher с обычными обработчиками.
+    Набор стран читается из общего двоичного снимка и только перечитывается после обновления
+    процессом приёма; общий темп отправки делится между процессами поровну.
+    """
+    start_warm_up()
+    follow_shared_dataset()
+
+    bot = Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL, request=Request(con_pool_size=SEND_WORKERS + 4))
+    dispatcher = Dispatcher(bot, Queue(), use_context=True)
+    register_handlers(dispatcher)
+
+    configure_api_response_store(create_cache_manager("api_responses"))
+    start_send_queue(global_rate=SEND_GLOBAL_RATE / BOT_WORKERS)
+    return dispatcher
+
+
+def start_worker_pool(dispatcher) -> WorkerPool:
+    """Запускает рабочие процессы; диспетчер процесса приёма только передаёт им обновления."""
+    # Настройки и кэш ответов API должны быть общими для всех процессов
+    for name, value in (("PREFS_BACKEND", PREFS_BACKEND), ("CACHE_BACKEND", CACHE_BACKEND)):
+        if value != "sqlite":
+            logger.info(f"Многопроцессный режим: {name}={value} заменён на sqlite")
+        os.environ[name] = "sqlite"
+
+    pool = WorkerPool(BOT_WORKERS, setup_worker).start()
+    dispatcher.add_handler(TypeHandler(Update, pool.dispatch))
+    return pool
+
+
 def main():
     """Запуск бота."""
     logger.info("=" * 50)
@@ -42,20 +178,23 @@ def main():
         return
 
     try:
-        updater = Updater(BOT_TOKEN, use_context=True)
+        # Данные и индексы готовятся параллельно с созданием клиента и подключением к Telegram
+        start_warm_up()
+
+        updater = Updater(BOT_TOKEN, base_url=TELEGRAM_API_URL, use_context=True)
         dispatcher = updater.dispatcher
 
-        dispatcher.add_handler(CommandHandler("start", start))
-        dispatcher.add_handler(CommandHandler("help", help_cmd))
-        dispatcher.add_handler(CommandHandler("info", info_cmd))
-        dispatcher.add_handler(CommandHandler("compare", compare_cmd))
-        dispatcher.add_handler(CommandHandler("top", top_cmd))
-        dispatcher.add_handler(CommandHandler("random", random_cmd))
-        dispatcher.add_handler(CommandHandler("setpref", setpref_cmd))
-        dispatcher.add_handler(CommandHandler("myprefs", myprefs_cmd))
-        dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_text))
+        pool = None
+        if BOT_WORKERS > 1:
+            logger.info(f"Многопроцессный режим: {BOT_WORKERS} рабочих процессов")
+            pool = start_worker_pool(dispatcher)
+        else:
+            register_handlers(dispatcher)
+            configure_api_response_store(create_cache_manager("api_responses"))
+            start_send_queue()
 
-        dispatcher.add_error_handler(error_handler)
+        # Набор стран обновляет только этот процесс; рабочие процессы перечитывают снимок
+        start_background_refresh(interval=COUNTRIES_REFRESH_INTERVAL, ttl=COUNTRIES_DATA_TTL)
 
         logger.info("Бот запущен!")
         print("=" * 50)
@@ -63,8 +202,31 @@ def main():
         print("Проверьте команду /start")
         print("=" * 50)
 
-        updater.start_polling()
+        webhook = None
+        if UPDATES_MODE == "webhook":
+            secret = WEBHOOK_SECRET or (secrets.token_urlsafe(32) if WEBHOOK_URL else "")
+            if not secret:
+                logger.error("Для режима webhook нужен WEBHOOK_SECRET или WEBHOOK_URL")
+                return
+            webhook = start_webhook(
+                updater, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+                secret_token=secret, public_url=WEBHOOK_URL
+            )
+        else:
+            updater.start_polling()
         updater.idle()
+        if webhook:
+            webhook.stop()
+        if pool:
+            pool.stop()
+        lane_router.shutdown()
+        # Асинхронный режим: дожидаемся начатых корутин и закрываем сессию aiohttp
+        runtime.stop()
+        send_queue.stop()
+        # Обновлённый набор стран мог ещё не дописаться на диск
+        flush_dataset_writes(timeout=30)
+        logger.info(f"Статистика REST Countries за время работы: {get_api_stats()}")
+        close_api_response_store()
 
     except Exception as e:
         logger.error(f"Ошибка запуска бота: {e}")
@@ -72,4 +234,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
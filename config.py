@@ -10,3 +10,67 @@ if not BOT_TOKEN:
     exit(1)
 
 PREFS_FILE = os.path.join(os.getcwd(), 'data', "user_prefs.json")
+
+# Фоновое обновление списка стран (секунды)
+COUNTRIES_REFRESH_INTERVAL = int(os.getenv("COUNTRIES_REFRESH_INTERVAL", 6 * 3600))
+COUNTRIES_DATA_TTL = int(os.getenv("COUNTRIES_DATA_TTL", 24 * 3600))
+
+# Режим обработки: "threads" — синхронные обработчики в потоках диспетчера,
+# "asyncio" — корутины в общем цикле событий
+BOT_MODE = os.getenv("BOT_MODE", "threads").lower()
+ASYNC_BLOCKING_WORKERS = int(os.getenv("ASYNC_BLOCKING_WORKERS", 16))
+
+# Кэш ответов API: "memory" — в памяти с сохранением в JSON, "sqlite" — общая база SQLite
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_DIR = os.path.join(os.getcwd(), 'data')
+CACHE_DB_FILE = os.getenv("CACHE_DB_FILE", os.path.join(CACHE_DIR, "cache.sqlite3"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", 24 * 3600))
+
+# Хранилище настроек пользователей: "json" — файл PREFS_FILE, "sqlite" — база PREFS_DB_FILE
+# (нужно, если настройки делят несколько процессов бота)
+PREFS_BACKEND = os.getenv("PREFS_BACKEND", "json").lower()
+PREFS_DB_FILE = os.getenv("PREFS_DB_FILE", os.path.join(os.getcwd(), 'data', "user_prefs.sqlite3"))
+
+# Исходящие сообщения: общий темп бота (сообщений/с), темп в личный чат и в группу,
+# число потоков отправки
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", 20 / 60))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 4))
+
+# Входящие команды: не больше USER_COMMAND_RATE в секунду от пользователя,
+# кратковременно — до USER_COMMAND_BURST подряд
+USER_COMMAND_RATE = float(os.getenv("USER_COMMAND_RATE", 1))
+USER_COMMAND_BURST = int(os.getenv("USER_COMMAND_BURST", 5))
+
+# Получение обновлений: "polling" — getUpdates, "webhook" — встроенный HTTP-сервер.
+# WEBHOOK_URL — публичный адрес, который регистрируется в Telegram (пусто — webhook настроен
+# заранее); WEBHOOK_SECRET — секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+# (если пуст, а WEBHOOK_URL задан, секрет генерируется при запуске)
+UPDATES_MODE = os.getenv("UPDATES_MODE", "polling").lower()
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# Адрес Bot API (можно направить на локальный тестовый сервер, см. fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+
+# Число процессов-обработчиков: 1 — всё в одном процессе; больше 1 — процесс приёма
+# распределяет обновления по рабочим процессам по id пользователя
+# (настройки и кэш тогда всегда хранятся в SQLite)
+BOT_WORKERS = max(1, int(os.getenv("BOT_WORKERS", 1)))
+
+# Полосы обработки команд (режим threads): потоков, максимум обновлений в очереди
+# и сколько секунд обновление может ждать, прежде чем пользователь получит ответ «занято».
+# fast — /start, /help, /random, /setpref, /myprefs; lookup — /info, /compare и текст; heavy — /top
+LANE_FAST_WORKERS = int(os.getenv("LANE_FAST_WORKERS", 4))
+LANE_FAST_QUEUE = int(os.getenv("LANE_FAST_QUEUE", 200))
+LANE_FAST_TIMEOUT = float(os.getenv("LANE_FAST_TIMEOUT", 5))
+LANE_LOOKUP_WORKERS = int(os.getenv("LANE_LOOKUP_WORKERS", 8))
+LANE_LOOKUP_QUEUE = int(os.getenv("LANE_LOOKUP_QUEUE", 200))
+LANE_LOOKUP_TIMEOUT = float(os.getenv("LANE_LOOKUP_TIMEOUT", 20))
+LANE_HEAVY_WORKERS = int(os.getenv("LANE_HEAVY_WORKERS", 2))
+LANE_HEAVY_QUEUE = int(os.getenv("LANE_HEAVY_QUEUE", 20))
+LANE_HEAVY_TIMEOUT = float(os.getenv("LANE_HEAVY_TIMEOUT", 30))
@@ -0,0 +1,248 @@
+"""
+Поддельный Telegram для сквозной проверки режима webhook.
+
+Скрипт поднимает локальный Bot API (getMe, setWebhook, deleteWebhook, sendMessage
+и прочие методы отвечают успехом, отправленные сообщения запоминаются), запускает
+бота в режиме webhook с TELEGRAM_API_URL, указывающим на этот сервер, и отправляет
+на webhook обновления /info от разных пользователей. Проверяется, что:
+  * обновление с неверным секретом отклоняется (403);
+  * на каждое обновление бот отвечает sendMessage в нужный чат;
+  * диалог «кнопка, затем название страны» работает (состояние пользователя
+    не теряется и при BOT_WORKERS > 1);
+  * команды разных участников одного группового чата получают ответы.
+Сеть не нужна, если есть локальный набор стран.
+
+Запуск: python fake_telegram.py [--updates 20] [--concurrency 4] [--port 8443]
+С уже запущенным ботом: python fake_telegram.py --no-spawn --api-port 8081 --secret S
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TOKEN = "123456:fake-token"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+QUERIES = ["Japan", "Germany", "Brazil", "Canada", "India", "France", "Kenya", "Peru"]
+
+
+class FakeBotApi:
+    """Минимальный Bot API: запоминает вызовы методов и сообщения, отправленные ботом."""
+    def __init__(self, port: int):
+        self.calls = []
+        self.sent = {}
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/bot"
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                if "json" in self.headers.get("Content-Type", ""):
+                    params = json.loads(body or "{}")
+                else:
+                    params = dict(parse_qsl(body))
+                self._reply(api.handle(method, params))
+
+            do_GET = do_POST
+
+            def _reply(self, result):
+                payload = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, method: str, params: dict):
+        with self._lock:
+            self.calls.append(method)
+            if method == "getMe":
+                return {"id": 123456, "is_bot": True, "first_name": "CountryBot", "username": "country_bot"}
+            if method == "sendMessage":
+                self._message_id += 1
+                chat_id = int(params["chat_id"])
+                self.sent.setdefault(chat_id, []).append(params.get("text", ""))
+                return {
+                    "message_id": self._message_id, "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", ""),
+                }
+            return True
+
+    def start(self) -> "FakeBotApi":
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+
+
+def make_update(update_id: int, user_id: int, text: str, chat_id: int = None) -> dict:
+    command_length = len(text.split()[0]) if text.startswith("/") else 0
+    chat = {"id": user_id, "type": "private"} if chat_id is None else {"id": chat_id, "type": "group"}
+    message = {
+        "message_id": update_id, "date": int(time.time()),
+        "chat": chat,
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+        "text": text,
+    }
+    if command_length:
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": command_length}]
+    return {"update_id": update_id, "message": message}
+
+
+def post_update(url: str, secret: str, update: dict) -> int:
+    request = urllib.request.Request(
+        url, data=json.dumps(update).encode("utf-8"), method="POST",
+        headers={"Content-Type": "application/json", SECRET_HEADER: secret},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_for_webhook(url: str, secret: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # Пустое тело: сервер отвечает 400, не передавая ничего диспетчеру
+            request = urllib.request.Request(url, data=b"", method="POST", headers={SECRET_HEADER: secret})
+            urllib.request.urlopen(request, timeout=1)
+            return True
+        except urllib.error.HTTPError:
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозная проверка режима webhook с поддельным Telegram")
+    parser.add_argument("--updates", type=int, default=20, help="сколько обновлений отправить")
+    parser.add_argument("--concurrency", type=int, default=4, help="параллельных запросов к webhook")
+    parser.add_argument("--port", type=int, default=8443, help="порт webhook-сервера бота")
+    parser.add_argument("--path", default="/telegram", help="путь webhook")
+    parser.add_argument("--api-port", type=int, default=0, help="порт поддельного Bot API (0 — любой свободный)")
+    parser.add_argument("--secret", default="fake-webhook-secret", help="секрет webhook")
+    parser.add_argument("--no-spawn", action="store_true", help="не запускать бота (он уже запущен)")
+    parser.add_argument("--timeout", type=float, default=60, help="сколько ждать ответов бота, с")
+    args = parser.parse_args()
+
+    api = FakeBotApi(args.api_port).start()
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    bot = None
+    if not args.no_spawn:
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN=TOKEN, TELEGRAM_API_URL=api.base_url,
+            UPDATES_MODE="webhook", WEBHOOK_LISTEN="127.0.0.1", WEBHOOK_PORT=str(args.port),
+            WEBHOOK_PATH=args.path, WEBHOOK_SECRET=args.secret, WEBHOOK_URL="",
+        )
+        bot = subprocess.Popen([sys.executable, "bot.py"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    print(f"Поддельный Bot API: {api.base_url}, webhook: {url}")
+
+    failures = []
+    try:
+        if not wait_for_webhook(url, args.secret, args.timeout):
+            print("Webhook-сервер бота не отвечает")
+            sys.exit(1)
+
+        status = post_update(url, "wrong-secret", make_update(1, 1, "/info Japan"))
+        print(f"Неверный секрет: HTTP {status}")
+        if status != 403:
+            failures.append(f"неверный секрет принят (HTTP {status})")
+
+        updates = [
+            make_update(100 + i, 1000 + i, f"/info {QUERIES[i % len(QUERIES)]}")
+            for i in range(args.updates)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            statuses = list(pool.map(lambda u: post_update(url, args.secret, u), updates))
+        posted = time.perf_counter() - started
+        print(f"Отправлено {len(updates)} обновлений за {posted:.3f} с, ответы webhook: "
+              f"{ {s: statuses.count(s) for s in set(statuses)} }")
+        if any(s != 200 for s in statuses):
+            failures.append("webhook ответил не 200")
+
+        expected = {u["message"]["chat"]["id"] for u in updates}
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline and not expected <= set(api.sent):
+            time.sleep(0.1)
+        answered = expected & set(api.sent)
+        print(f"Бот ответил в {len(answered)} из {len(expected)} чатов "
+              f"за {time.perf_counter() - started:.3f} с")
+        if answered != expected:
+            failures.append(f"нет ответа в чатах: {sorted(expected - answered)[:10]}")
+        if 1 in api.sent:
+            failures.append("бот ответил на обновление с неверным секретом")
+        for chat_id in sorted(answered)[:3]:
+            print(f"--- чат {chat_id}\n{api.sent[chat_id][0]}")
+
+        # Диалог: ответ на кнопку сохраняет состояние, следующее сообщение — название страны
+        dialog_chats = [5000 + i for i in range(min(args.updates, 5))]
+        for i, chat_id in enumerate(dialog_chats):
+            post_update(url, args.secret, make_update(500 + 2 * i, chat_id, "🌍 Информация о стране"))
+            post_update(url, args.secret, make_update(501 + 2 * i, chat_id, "Japan"))
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline and any(len(api.sent.get(c, ())) < 2 for c in dialog_chats):
+            time.sleep(0.1)
+        broken = [c for c in dialog_chats if "Tokyo" not in "".join(api.sent.get(c, ()))]
+        print(f"Диалогов завершено: {len(dialog_chats) - len(broken)} из {len(dialog_chats)}")
+        if broken:
+            failures.append(f"диалог не завершён в чатах: {broken}")
+
+        # Групповой чат: все ответы в группу отправляет один процесс (см. services.workers.shard_key)
+        group_id = -1001
+        group_queries = QUERIES[:3]
+        for i, query in enumerate(group_queries):
+            post_update(url, args.secret, make_update(700 + i, 7000 + i, f"/info {query}", chat_id=group_id))
+        # Ответы одного чата могут склеиться очередью отправки, поэтому проверяется общий текст
+        deadline = time.monotonic() + args.timeout
+        missing = group_queries
+        while time.monotonic() < deadline and missing:
+            time.sleep(0.1)
+            group_text = "".join(api.sent.get(group_id, ()))
+            missing = [q for q in group_queries if q not in group_text]
+        print(f"Групповой чат: ответов {len(api.sent.get(group_id, ()))}, без ответа: {missing}")
+        if missing:
+            failures.append(f"нет ответа в группе на: {missing}")
+    finally:
+        if bot is not None:
+            bot.terminate()
+            bot.wait(30)
+        api.stop()
+
+    if failures:
+        print("ОШИБКИ: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
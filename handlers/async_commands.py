@@ -0,0 +1,216 @@
+import logging
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from handlers import commands
+from handlers.commands import (
+    get_main_keyboard, not_found_text, parse_compare_query, compare_not_found_text,
+    parse_top_args, top_text, random_text, format_prefs, COMPARE_USAGE
+)
+from services.aio import run_blocking, runtime
+from services.restcountries import afetch_country_by_name, afetch_countries_by_names, afetch_all_countries
+from services.prefs import set_user_pref, get_user_prefs
+from services.workers import shard_key
+from utils.formatting import format_country_info, format_comparison
+
+logger = logging.getLogger(__name__)
+
+
+# Асинхронный режим (BOT_MODE=asyncio): обработчики — корутины в общем цикле событий.
+# Диспетчер вызывает обёртку из as_dispatcher_callback, которая только ставит корутину
+# в цикл, поэтому потоки диспетчера не ждут ни API, ни файлов. Корутины одного
+# пользователя (в группе — одного чата, тот же ключ, что у полос) выполняются по очереди,
+# поэтому диалог «кнопка, затем ответ текстом» не перемешивается.
+
+def as_dispatcher_callback(handler):
+    """Превращает корутину-обработчик в обычный callback для Dispatcher."""
+    def callback(update: Update, context: CallbackContext) -> None:
+        runtime.submit_ordered(shard_key(update), handler(update, context))
+    callback.__name__ = handler.__name__
+    return callback
+
+
+async def reply(update: Update, text: str, **kwargs) -> None:
+    """Ставит ответ в общую очередь отправки: цикл событий не ждёт Bot API."""
+    kwargs.setdefault('reply_markup', get_main_keyboard())
+    commands.reply(update, text, **kwargs)
+
+
+async def info_cmd(update: Update, context: CallbackContext) -> None:
+    try:
+        if not context.args:
+            # Подсказка только ставится в очередь отправки; waiting_for сохраняется
+            # сразу, до первого await
+            commands.info_cmd(update, context)
+            return
+
+        query = " ".join(context.args)
+        logger.info(f"Поиск информации о стране: '{query}'")
+
+        data = await afetch_country_by_name(query)
+        if not data:
+            await reply(update, not_found_text(query))
+            return
+
+        await reply(update, format_country_info(data), disable_web_page_preview=False)
+
+    except Exception as e:
+        logger.error(f"Ошибка в info_cmd: {e}", exc_info=True)
+        await reply(update, "Ошибка при получении информации о стране.")
+
+
+async def compare_cmd(update: Update, context: CallbackContext) -> None:
+    try:
+        if not context.args:
+            # Подсказка только ставится в очередь отправки; waiting_for сохраняется
+            # сразу, до первого await
+            commands.compare_cmd(update, context)
+            return
+
+        raw = " ".join(context.args)
+        logger.info(f"Строка для сравнения: '{raw}'")
+
+        names = parse_compare_query(raw)
+        if not names:
+            await reply(update, COMPARE_USAGE)
+            return
+
+        # Все страны ищутся одновременно
+        countries = await afetch_countries_by_names(names)
+
+        not_found = [q for q, c in zip(names, countries) if not c]
+        if not_found:
+            logger.warning(f"Страны не найдены: {not_found}")
+            await reply(update, compare_not_found_text(not_found))
+            return
+
+        await reply(update, format_comparison(countries, names), parse_mode='Markdown')
+        logger.info(f"Сравнение успешно отправлено: {' vs '.join(names)}")
+
+    except Exception as e:
+        logger.error(f"Ошибка в compare_cmd: {e}", exc_info=True)
+        await reply(update, "Ошибка при сравнении стран.")
+
+
+async def top_cmd(update: Update, context: CallbackContext) -> None:
+    try:
+        if not context.args:
+            # Подсказка только ставится в очередь отправки; waiting_for сохраняется
+            # сразу, до первого await
+            commands.top_cmd(update, context)
+            return
+
+        metric, n, region, error = parse_top_args(context.args)
+        if error:
+            await reply(update, error)
+            return
+
+        all_c = await afetch_all_countries()
+        if not all_c:
+            logger.error("Не удалось получить список стран.")
+            await reply(
+                update,
+                "⚠️ Не удалось получить данные из базы стран.\n"
+                "Попробуйте позже или используйте другие команды."
+            )
+            return
+
+        text = top_text(metric, n, region)
+        await reply(update, text or "Не удалось обработать данные стран.")
+
+    except Exception as e:
+        logger.error(f"Ошибка в top_cmd: {e}", exc_info=True)
+        await reply(
+            update,
+            "❌ Ошибка при формировании топа стран.\n"
+            "Попробуйте снова или выберите другое действие."
+        )
+
+
+async def random_cmd(update: Update, context: CallbackContext) -> None:
+    """Показать случайную страну"""
+    try:
+        # Выбор из набора в памяти, ждать нечего — ответ формируется прямо в цикле событий
+        user_id = update.effective_user.id if update.effective_user else 0
+        await reply(
+            update,
+            random_text(user_id, context.args or []),
+            parse_mode='Markdown',
+            disable_web_page_preview=False
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в random_cmd: {e}", exc_info=True)
+        await reply(
+            update,
+            "🎲 К сожалению, не удалось получить случайную страну.\n"
+            "Попробуйте ещё раз или используйте другую команду."
+        )
+
+
+async def setpref_cmd(update: Update, context: CallbackContext) -> None:
+    try:
+        if len(context.args) < 2:
+            await reply(update, "Использование: /setpref <ключ> <значение>\nПример: /setpref currency USD")
+            return
+
+        key = context.args[0]
+        value = " ".join(context.args[1:])
+
+        await run_blocking(set_user_pref, update.effective_user.id, key, value)
+        await reply(update, f"✅ Настройка сохранена:\n{key} = {value}")
+
+    except Exception as e:
+        logger.error(f"Ошибка в setpref_cmd: {e}")
+
+
+async def myprefs_cmd(update: Update, context: CallbackContext) -> None:
+    try:
+        prefs = await run_blocking(get_user_prefs, update.effective_user.id)
+        await reply(update, format_prefs(prefs))
+
+    except Exception as e:
+        logger.error(f"Ошибка в myprefs_cmd: {e}")
+
+
+# Кнопки меню и ожидаемый ввод направляются в асинхронные обработчики
+BUTTON_HANDLERS = {
+    '🌍 Информация о стране': info_cmd,
+    '🎲 Случайная страна': random_cmd,
+    '📊 Сравнить страны': compare_cmd,
+    '🏆 Топ стран': top_cmd,
+    '⚙️ Мои настройки': myprefs_cmd,
+}
+
+
+async def handle_text(update: Update, context: CallbackContext) -> None:
+    try:
+        text = update.message.text
+
+        handler = BUTTON_HANDLERS.get(text)
+        if handler:
+            context.args = []
+            await handler(update, context)
+            return
+
+        waiting_for = context.user_data.get('waiting_for')
+        if waiting_for == 'country_info' and text.strip():
+            context.user_data.pop('waiting_for', None)
+            context.args = [text]
+            await info_cmd(update, context)
+        elif waiting_for == 'country_compare' and text.strip() and "|" in text:
+            context.user_data.pop('waiting_for', None)
+            context.args = [text]
+            await compare_cmd(update, context)
+        elif waiting_for == 'country_top' and len(text.split()) >= 2:
+            context.user_data.pop('waiting_for', None)
+            context.args = text.split()
+            await top_cmd(update, context)
+        else:
+            # Кнопка помощи, ошибки ввода и непонятные сообщения — в синхронном обработчике,
+            # он только отвечает текстом
+            await run_blocking(commands.handle_text, update, context)
+
+    except Exception as e:
+        logger.error(f"Ошибка в handle_text: {e}")
+        await reply(update, "Ошибка при обработке сообщения.")
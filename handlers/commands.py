@@ -1,23 +1,194 @@
 import logging
-import random
+from functools import partial
+
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.error import BadRequest
 from telegram.ext import CallbackContext
-
-from services.restcountries import fetch_country_by_name, fetch_all_countries
+from telegram.utils.helpers import escape_markdown
+
+from services.restcountries import (
+    fetch_country_by_name, fetch_countries_by_names, fetch_all_countries, suggest_countries,
+    get_country_registry
+)
+from services.random_country import random_picker
+from services.send_queue import send_queue
+from services.registry import RANKING_METRICS, country_registry
 from services.prefs import set_user_pref, get_user_prefs
-from utils.formatting import format_country_info, build_top_df
+from utils.formatting import (
+    format_country_info, format_random_country, format_comparison, format_top,
+    precompute_country_info
+)
 
 logger = logging.getLogger(__name__)
 
+MAX_COMPARE_COUNTRIES = 10
+COMPARE_USAGE = (
+    f"Использование: /compare A | B [| C ...] (от 2 до {MAX_COMPARE_COUNTRIES} стран)\n"
+    "Пример: /compare Russia | Germany | Japan"
+)
+TOP_USAGE = (
+    "Использование: /top <population|area|density> <N> [регион]\n"
+    "Пример: /top population 10 или /top area 5 Europe"
+)
 
-# Создаем клавиатуру для меню
-def get_main_keyboard():
-    keyboard = [
+SEND_FAILED_TEXT = "⚠️ Не удалось отправить ответ. Попробуйте, пожалуйста, ещё раз."
+
+RANDOM_USAGE = (
+    "Использование: /random [population] [регион]\n"
+    "Пример: /random, /random Europe или /random population Asia"
+)
+
+
+# Клавиатуры создаются один раз и переиспользуются во всех ответах
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    [
         ['🌍 Информация о стране', '🎲 Случайная страна'],
         ['📊 Сравнить страны', '🏆 Топ стран'],
         ['⚙️ Мои настройки', '❓ Помощь']
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=False
+)
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+MAIN_KEYBOARD_BUTTONS = frozenset(button.text for row in MAIN_KEYBOARD.keyboard for button in row)
+
+# Карточки стран форматируются заранее при каждой загрузке набора данных
+country_registry.on_load(precompute_country_info)
+
+
+def get_main_keyboard():
+    return MAIN_KEYBOARD
+
+
+def reply(update: Update, text: str, **kwargs):
+    """
+    Ставит ответ в очередь отправки: обработчик не ждёт сети и лимитов Telegram.
+    Если Telegram отклонит сообщение (например, из-за разметки), пользователь
+    получит короткое сообщение об ошибке без разметки.
+    """
+    return send_queue.reply(update.message, text, on_error=partial(_reply_failed, update), **kwargs)
+
+
+def _reply_failed(update: Update, error: Exception) -> None:
+    if isinstance(error, BadRequest):
+        send_queue.reply(update.message, SEND_FAILED_TEXT, reply_markup=get_main_keyboard())
+
+
+# --- Общие части обработчиков (используются и в асинхронном режиме) ---
+
+def not_found_text(query: str) -> str:
+    """Сообщение о ненайденной стране с подсказками похожих названий."""
+    text = f"Страна '{query}' не найдена."
+    suggestions = suggest_countries(query)
+    if suggestions:
+        text += f"\nВозможно, вы имели в виду: {', '.join(suggestions)}"
+    else:
+        text += " Попробуйте ещё раз."
+    return text
+
+
+def parse_compare_query(raw: str):
+    """Разбирает строку 'A | B | ...'. Возвращает список названий или None, если формат неверный."""
+    # Если команда была через /compare, убираем "/compare " из начала
+    if raw.startswith('/compare '):
+        raw = raw.replace('/compare ', '', 1)
+
+    names = [part.strip() for part in raw.split("|")]
+    if len(names) < 2 or len(names) > MAX_COMPARE_COUNTRIES:
+        return None
+    if not all(names):
+        logger.warning(f"Пустые названия в запросе сравнения: {names}")
+        return None
+    return names
+
+
+def compare_not_found_text(not_found) -> str:
+    """Сообщение о ненайденных при сравнении странах с подсказками."""
+    hints = []
+    for query in not_found:
+        suggestions = suggest_countries(query)
+        if suggestions:
+            hints.append(f"• {query} → {', '.join(suggestions)}")
+
+    text = (
+        f"Не удалось найти страны: {', '.join(not_found)}\n"
+        f"Проверьте названия и попробуйте снова.\n\n"
+    )
+    if hints:
+        text += "Возможно, вы имели в виду:\n" + "\n".join(hints)
+    else:
+        text += "Доступные страны: Russia, Germany, United States, China, India, Brazil, Japan, France, United Kingdom, Italy и другие."
+    return text
+
+
+def parse_top_args(args):
+    """
+    Проверяет аргументы /top. Возвращает (metric, n, region, None)
+    или (None, None, None, текст ошибки); region — None, если не указан.
+    """
+    if len(args) < 2:
+        return None, None, None, TOP_USAGE
+
+    metric = args[0].lower()
+    if metric not in RANKING_METRICS:
+        return None, None, None, (
+            "Метрика должна быть: population (население), area (площадь) "
+            "или density (плотность населения)"
+        )
+
+    try:
+        n = int(args[1])
+    except ValueError:
+        return None, None, None, "N должно быть числом"
+    if n <= 0 or n > 50:
+        return None, None, None, "Введите число от 1 до 50"
+
+    region = " ".join(args[2:]).strip() or None
+    if region:
+        regions = get_country_registry().regions()
+        matched = next((r for r in regions if r.casefold() == region.casefold()), None)
+        if not matched:
+            return None, None, None, f"Неизвестный регион '{region}'. Доступные: {', '.join(regions)}"
+        region = matched
+    return metric, n, region, None
+
+
+def top_text(metric: str, n: int, region=None):
+    """Текст топа из заранее построенного рейтинга реестра или None, если данных нет."""
+    registry = get_country_registry()
+    rows = registry.top(metric, n, region=region)
+    if not rows:
+        return None
+    return format_top(rows, metric, n, version=registry.rankings_version, region=region)
+
+
+def random_text(user_id: int, args) -> str:
+    """
+    Ответ /random (Markdown): карточка случайной страны из набора в памяти.
+    args: необязательное слово population (выбор с весом по населению) и регион.
+    """
+    weighted = bool(args) and args[0].lower() == "population"
+    region = " ".join(args[1:] if weighted else args).strip() or None
+
+    registry = get_country_registry()
+    country = random_picker.pick(user_id, weighted=weighted, region=region)
+    if country is None:
+        if region:
+            # Регион введён пользователем: без экранирования Telegram отклонит разметку
+            regions = ", ".join(registry.regions())
+            return escape_markdown(f"Неизвестный регион '{region}'. Доступные: {regions}\n\n{RANDOM_USAGE}")
+        return "🎲 Данные о странах пока недоступны. Попробуйте позже."
+    return format_random_country(country)
+
+
+def format_prefs(prefs) -> str:
+    """Текст со списком настроек пользователя."""
+    if not prefs:
+        return "У вас нет сохраненных настроек."
+    msg = "⚙️ Ваши настройки:\n\n"
+    for k, v in prefs.items():
+        msg += f"• {k}: {v}\n"
+    return msg
 
 
 def start(update: Update, context: CallbackContext) -> None:
@@ -27,20 +198,21 @@ def start(update: Update, context: CallbackContext) -> None:
             "Я помогу вам узнать информацию о любой стране мира.\n\n"
             "Используйте кнопки меню ниже или команды:\n"
             "• /info <страна> - информация о стране\n"
-            "• /compare <страна1> | <страна2> - сравнение\n"
-            "• /top <population|area> <N> - топ стран\n"
-            "• /random - случайная страна\n"
+            "• /compare <страна1> | <страна2> [| ...] - сравнение\n"
+            "• /top <population|area|density> <N> [регион] - топ стран\n"
+            "• /random [population] [регион] - случайная страна\n"
             "• /help - помощь\n\n"
             "Выберите действие:"
         )
 
-        update.message.reply_text(
+        reply(
+            update,
             welcome_text,
             reply_markup=get_main_keyboard()
         )
     except Exception as e:
         logger.error(f"Ошибка в start: {e}")
-        update.message.reply_text("Ошибка при запуске бота.")
+        reply(update, "Ошибка при запуске бота.")
 
 
 def help_cmd(update: Update, context: CallbackContext) -> None:
@@ -53,22 +225,25 @@ def help_cmd(update: Update, context: CallbackContext) -> None:
             "   Пример: /info Russia\n\n"
             "2. Сравнение стран\n"
             "   - Нажмите кнопку '📊 Сравнить страны'\n"
-            "   - Или введите: /compare <A> | <B>\n"
-            "   Пример: /compare Russia | Germany\n\n"
+            f"   - Или введите: /compare <A> | <B> [| ...] (до {MAX_COMPARE_COUNTRIES} стран)\n"
+            "   Пример: /compare Russia | Germany | Japan\n\n"
             "3. Топ стран\n"
             "   - Нажмите кнопку '🏆 Топ стран'\n"
-            "   - Или введите: /top <population|area> <N>\n"
-            "   Пример: /top population 10\n\n"
+            "   - Или введите: /top <population|area|density> <N> [регион]\n"
+            "   Пример: /top population 10 или /top area 5 Europe\n\n"
             "4. Случайная страна\n"
             "   - Нажмите кнопку '🎲 Случайная страна'\n"
-            "   - Или введите: /random\n\n"
+            "   - Или введите: /random [population] [регион]\n"
+            "   population — чаще выпадают страны с большим населением\n"
+            "   Пример: /random Europe или /random population Asia\n\n"
             "5. Настройки\n"
             "   - /setpref <ключ> <значение> - сохранить настройку\n"
             "   - /myprefs - показать мои настройки\n\n"
             "Просто нажимайте на нужные кнопки! 👇"
         )
 
-        update.message.reply_text(
+        reply(
+            update,
             help_text,
             reply_markup=get_main_keyboard()
         )
@@ -80,10 +255,11 @@ def info_cmd(update: Update, context: CallbackContext) -> None:
     try:
         # Если команда вызвана через кнопку, ждем ввода страны
         if not context.args:
-            update.message.reply_text(
+            reply(
+                update,
                 "Введите название страны:\n"
                 "Например: Russia, Germany, Japan",
-                reply_markup=ReplyKeyboardRemove()
+                reply_markup=REMOVE_KEYBOARD
             )
             # Сохраняем состояние для следующего сообщения
             context.user_data['waiting_for'] = 'country_info'
@@ -95,15 +271,17 @@ def info_cmd(update: Update, context: CallbackContext) -> None:
 
         data = fetch_country_by_name(query)
         if not data:
-            update.message.reply_text(
-                f"Страна '{query}' не найдена. Попробуйте ещё раз.",
+            reply(
+                update,
+                not_found_text(query),
                 reply_markup=get_main_keyboard()
             )
             return
 
         country_info = format_country_info(data)
 
-        update.message.reply_text(
+        reply(
+            update,
             country_info,
             reply_markup=get_main_keyboard(),
             disable_web_page_preview=False
@@ -111,7 +289,8 @@ def info_cmd(update: Update, context: CallbackContext) -> None:
 
     except Exception as e:
         logger.error(f"Ошибка в info_cmd: {e}", exc_info=True)
-        update.message.reply_text(
+        reply(
+            update,
             "Ошибка при получении информации о стране.",
             reply_markup=get_main_keyboard()
         )
@@ -121,116 +300,55 @@ def compare_cmd(update: Update, context: CallbackContext) -> None:
     try:
         # Если команда вызвана через кнопку, ждем ввода стран
         if not context.args:
-            update.message.reply_text(
-                "Введите две страны через | (вертикальную черту):\n"
-                "Например: Russia | Germany",
-                reply_markup=ReplyKeyboardRemove()
+            reply(
+                update,
+                f"Введите от 2 до {MAX_COMPARE_COUNTRIES} стран через | (вертикальную черту):\n"
+                "Например: Russia | Germany | Japan",
+                reply_markup=REMOVE_KEYBOARD
             )
             context.user_data['waiting_for'] = 'country_compare'
             return
 
         # Получаем строку для сравнения
         raw = " ".join(context.args) if context.args else update.message.text
-
-        # Если команда была через /compare, убираем "/compare " из начала
-        if raw.startswith('/compare '):
-            raw = raw.replace('/compare ', '', 1)
-
         logger.info(f"Строка для сравнения: '{raw}'")
 
-        if "|" not in raw:
-            update.message.reply_text(
-                "Использование: /compare A | B\nПример: /compare Russia | Germany",
+        names = parse_compare_query(raw)
+        if not names:
+            reply(
+                update,
+                COMPARE_USAGE,
                 reply_markup=get_main_keyboard()
             )
             return
 
-        # Разделяем по символу "|"
-        parts = raw.split("|")
-        if len(parts) != 2:
-            update.message.reply_text(
-                "Использование: /compare A | B\nПример: /compare Russia | Germany",
-                reply_markup=get_main_keyboard()
-            )
-            return
+        logger.info(f"Страны для сравнения: {names}")
 
-        left = parts[0].strip()
-        right = parts[1].strip()
+        # Все страны ищутся одним пакетом: локальные сразу, остальные параллельно через API
+        countries = fetch_countries_by_names(names)
 
-        logger.info(f"Левая страна: '{left}', правая страна: '{right}'")
-
-        if not left or not right:
-            logger.warning(f"Пустые названия: left='{left}', right='{right}'")
-            update.message.reply_text(
-                "Ошибка: одна из стран не указана.\n"
-                "Использование: /compare A | B\nПример: /compare Russia | Germany",
+        not_found = [q for q, c in zip(names, countries) if not c]
+        if not_found:
+            logger.warning(f"Страны не найдены: {not_found}")
+            reply(
+                update,
+                compare_not_found_text(not_found),
                 reply_markup=get_main_keyboard()
             )
             return
 
-        # Получаем данные о странах
-        logger.info(f"Поиск страны: '{left}'")
-        c1 = fetch_country_by_name(left)
-
-        logger.info(f"Поиск страны: '{right}'")
-        c2 = fetch_country_by_name(right)
-
-        if not c1 or not c2:
-            not_found = []
-            if not c1:
-                not_found.append(left)
-                logger.warning(f"Страна '{left}' не найдена")
-            if not c2:
-                not_found.append(right)
-                logger.warning(f"Страна '{right}' не найдена")
-
-            update.message.reply_text(
-                f"Не удалось найти страны: {', '.join(not_found)}\n"
-                f"Проверьте названия и попробуйте снова.\n\n"
-                f"Доступные страны: Russia, Germany, United States, China, India, Brazil, Japan, France, United Kingdom, Italy и другие.",
-                reply_markup=get_main_keyboard()
-            )
-            return
-
-        # Получаем названия стран
-        name1 = c1.get("name", {})
-        if isinstance(name1, dict):
-            name1 = name1.get("common", left)
-        else:
-            name1 = str(name1)
-
-        name2 = c2.get("name", {})
-        if isinstance(name2, dict):
-            name2 = name2.get("common", right)
-        else:
-            name2 = str(name2)
-
-        # Получаем числовые данные
-        pop1 = c1.get("population", 0)
-        pop2 = c2.get("population", 0)
-        area1 = c1.get("area", 0)
-        area2 = c2.get("area", 0)
-
-        # Форматируем сообщение
-        msg = (
-                f"📊 Сравнение {name1} и {name2}\n\n"
-                f"• 👥 Население:\n"
-                f"  {name1}: {pop1:,}".replace(",", "_") + "\n"
-                f"  {name2}: {pop2:,}".replace(",", "_") + "\n\n"
-                f"• 📏 Площадь (км²):\n"
-                f"  {name1}: {area1:,}".replace(",", "_") + "\n"
-                f"  {name2}: {area2:,}".replace(",", "_")
-        )
-
-        update.message.reply_text(
-            msg,
-            reply_markup=get_main_keyboard()
+        reply(
+            update,
+            format_comparison(countries, names),
+            reply_markup=get_main_keyboard(),
+            parse_mode='Markdown'
         )
-        logger.info(f"Сравнение успешно отправлено: {name1} vs {name2}")
+        logger.info(f"Сравнение успешно отправлено: {' vs '.join(names)}")
 
     except Exception as e:
         logger.error(f"Ошибка в compare_cmd: {e}", exc_info=True)
-        update.message.reply_text(
+        reply(
+            update,
             "Ошибка при сравнении стран.",
             reply_markup=get_main_keyboard()
         )
@@ -240,41 +358,21 @@ def top_cmd(update: Update, context: CallbackContext) -> None:
     try:
         # Если команда вызвана через кнопку, ждем ввод параметров
         if not context.args:
-            update.message.reply_text(
+            reply(
+                update,
                 "Введите параметры для топа:\n"
                 "Например: population 10\n"
-                "Доступные метрики: population (население), area (площадь)",
-                reply_markup=ReplyKeyboardRemove()
+                "Доступные метрики: population (население), area (площадь), density (плотность)",
+                reply_markup=REMOVE_KEYBOARD
             )
             context.user_data['waiting_for'] = 'country_top'
             return
 
-        if len(context.args) < 2:
-            update.message.reply_text(
-                "Использование: /top <population|area> <N>\nПример: /top population 10",
-                reply_markup=get_main_keyboard()
-            )
-            return
-
-        metric = context.args[0].lower()
-        if metric not in ("population", "area"):
-            update.message.reply_text(
-                "Метрика должна быть: population (население) или area (площадь)",
-                reply_markup=get_main_keyboard()
-            )
-            return
-
-        try:
-            n = int(context.args[1])
-            if n <= 0 or n > 50:
-                update.message.reply_text(
-                    "Введите число от 1 до 50",
-                    reply_markup=get_main_keyboard()
-                )
-                return
-        except ValueError:
-            update.message.reply_text(
-                "N должно быть числом",
+        metric, n, region, error = parse_top_args(context.args)
+        if error:
+            reply(
+                update,
+                error,
                 reply_markup=get_main_keyboard()
             )
             return
@@ -284,43 +382,33 @@ def top_cmd(update: Update, context: CallbackContext) -> None:
 
         if not all_c:
             logger.error("Не удалось получить список стран.")
-            update.message.reply_text(
+            reply(
+                update,
                 "⚠️ Не удалось получить данные из базы стран.\n"
                 "Попробуйте позже или используйте другие команды.",
                 reply_markup=get_main_keyboard()
             )
             return
 
-        # Строим DataFrame
-        df = build_top_df(all_c)
-
-        if df.empty:
-            update.message.reply_text(
+        text = top_text(metric, n, region)
+        if not text:
+            reply(
+                update,
                 "Не удалось обработать данные стран.",
                 reply_markup=get_main_keyboard()
             )
             return
 
-        # Сортируем и берем топ N
-        df = df.sort_values(by=metric, ascending=False).head(n)
-
-        metric_name = "населению" if metric == "population" else "площади"
-        text = f"🏆 Топ {n} стран по {metric_name}\n\n"
-
-        medals = ["🥇", "🥈", "🥉"]
-        for i, (_, row) in enumerate(df.iterrows()):
-            medal = medals[i] if i < 3 else f"{i + 1}."
-            value = f"{row[metric]:,}".replace(",", "_")
-            text += f"{medal} {row['name']}: {value}\n"
-
-        update.message.reply_text(
+        reply(
+            update,
             text,
             reply_markup=get_main_keyboard()
         )
 
     except Exception as e:
         logger.error(f"Ошибка в top_cmd: {e}", exc_info=True)
-        update.message.reply_text(
+        reply(
+            update,
             "❌ Ошибка при формировании топа стран.\n"
             "Попробуйте снова или выберите другое действие.",
             reply_markup=get_main_keyboard()
@@ -330,53 +418,11 @@ def top_cmd(update: Update, context: CallbackContext) -> None:
 def random_cmd(update: Update, context: CallbackContext) -> None:
     """Показать случайную страну"""
     try:
-        # Используем предопределенный список популярных стран для надежности
-        popular_countries = [
-            "Russia", "Germany", "United States", "China", "India",
-            "Brazil", "Japan", "France", "United Kingdom", "Italy",
-            "Canada", "Australia", "Spain", "Mexico", "South Korea",
-            "Ukraine", "Poland", "Turkey", "Egypt", "Vietnam",
-            "Thailand", "Netherlands", "Sweden", "Norway", "Switzerland",
-            "Argentina", "Chile", "Colombia", "Peru", "Venezuela",
-            "Indonesia", "Malaysia", "Philippines", "Singapore", "Saudi Arabia",
-            "South Africa", "Nigeria", "Kenya", "Morocco", "Algeria"
-        ]
-
-        # Выбираем случайную страну
-        random_country_name = random.choice(popular_countries)
-
-        # Получаем данные о стране
-        country_data = fetch_country_by_name(random_country_name)
-
-        if not country_data:
-            # Если не удалось получить данные о выбранной стране,
-            # пробуем другую случайную страну из списка
-            attempts = 0
-            while attempts < 3 and not country_data:
-                random_country_name = random.choice(popular_countries)
-                country_data = fetch_country_by_name(random_country_name)
-                attempts += 1
-
-            # Если после 3 попыток данные не получены, используем резервную информацию
-            if not country_data:
-                # Отправляем простой ответ с названием страны
-                update.message.reply_text(
-                    f"🎲 *Случайная страна:* {random_country_name}\n\n"
-                    f"К сожалению, не удалось загрузить подробную информацию о стране.\n"
-                    f"Попробуйте команду /info {random_country_name}",
-                    reply_markup=get_main_keyboard(),
-                    parse_mode='Markdown'
-                )
-                return
-
-        # Форматируем информацию о стране
-        country_info = format_country_info(country_data)
-
-        # Создаем чистое сообщение без технических деталей
-        full_message = f"🎲 *Случайная страна:*\n\n{country_info}"
-
-        update.message.reply_text(
-            full_message,
+        # Выбор из набора в памяти: без обращений к API и диску
+        user_id = update.effective_user.id if update.effective_user else 0
+        reply(
+            update,
+            random_text(user_id, context.args or []),
             reply_markup=get_main_keyboard(),
             parse_mode='Markdown',
             disable_web_page_preview=False
@@ -386,7 +432,8 @@ def random_cmd(update: Update, context: CallbackContext) -> None:
         logger.error(f"Ошибка в random_cmd: {e}", exc_info=True)
 
         # Более дружелюбное сообщение об ошибке
-        update.message.reply_text(
+        reply(
+            update,
             "🎲 К сожалению, не удалось получить случайную страну.\n"
             "Попробуйте ещё раз или используйте другую команду.",
             reply_markup=get_main_keyboard()
@@ -396,7 +443,8 @@ def random_cmd(update: Update, context: CallbackContext) -> None:
 def setpref_cmd(update: Update, context: CallbackContext) -> None:
     try:
         if len(context.args) < 2:
-            update.message.reply_text(
+            reply(
+                update,
                 "Использование: /setpref <ключ> <значение>\nПример: /setpref currency USD",
                 reply_markup=get_main_keyboard()
             )
@@ -406,7 +454,8 @@ def setpref_cmd(update: Update, context: CallbackContext) -> None:
         value = " ".join(context.args[1:])
 
         set_user_pref(update.effective_user.id, key, value)
-        update.message.reply_text(
+        reply(
+            update,
             f"✅ Настройка сохранена:\n{key} = {value}",
             reply_markup=get_main_keyboard()
         )
@@ -418,19 +467,9 @@ def setpref_cmd(update: Update, context: CallbackContext) -> None:
 def myprefs_cmd(update: Update, context: CallbackContext) -> None:
     try:
         prefs = get_user_prefs(update.effective_user.id)
-        if not prefs:
-            update.message.reply_text(
-                "У вас нет сохраненных настроек.",
-                reply_markup=get_main_keyboard()
-            )
-            return
-
-        msg = "⚙️ Ваши настройки:\n\n"
-        for k, v in prefs.items():
-            msg += f"• {k}: {v}\n"
-
-        update.message.reply_text(
-            msg,
+        reply(
+            update,
+            format_prefs(prefs),
             reply_markup=get_main_keyboard()
         )
 
@@ -468,7 +507,7 @@ def handle_text(update: Update, context: CallbackContext) -> None:
 
                 if waiting_for == 'country_info':
                     if not text.strip():
-                        update.message.reply_text("Название страны не может быть пустым.")
+                        reply(update, "Название страны не может быть пустым.")
                         return
                     context.args = [text]
                     info_cmd(update, context)
@@ -476,11 +515,12 @@ def handle_text(update: Update, context: CallbackContext) -> None:
 
                 elif waiting_for == 'country_compare':
                     if not text.strip():
-                        update.message.reply_text("Ввод не может быть пустым.")
+                        reply(update, "Ввод не может быть пустым.")
                         return
                     if "|" not in text:
-                        update.message.reply_text(
-                            "Пожалуйста, введите две страны через |\nПример: Russia | Germany"
+                        reply(
+                            update,
+                            "Пожалуйста, введите страны через |\nПример: Russia | Germany"
                         )
                         return
 
@@ -491,12 +531,13 @@ def handle_text(update: Update, context: CallbackContext) -> None:
 
                 elif waiting_for == 'country_top':
                     if not text.strip():
-                        update.message.reply_text("Ввод не может быть пустым.")
+                        reply(update, "Ввод не может быть пустым.")
                         return
                     parts = text.split()
-                    if len(parts) != 2:
-                        update.message.reply_text(
-                            "Введите две части: метрику и число\nПример: population 10"
+                    if len(parts) < 2:
+                        reply(
+                            update,
+                            "Введите метрику и число (и при желании регион)\nПример: population 10"
                         )
                         return
                     context.args = parts
@@ -504,14 +545,16 @@ def handle_text(update: Update, context: CallbackContext) -> None:
                     context.user_data.pop('waiting_for', None)
 
             else:
-                update.message.reply_text(
+                reply(
+                    update,
                     "Я не понял ваш запрос. Пожалуйста, используйте кнопки меню или команды.",
                     reply_markup=get_main_keyboard()
                 )
 
     except Exception as e:
         logger.error(f"Ошибка в handle_text: {e}")
-        update.message.reply_text(
+        reply(
+            update,
             "Ошибка при обработке сообщения.",
             reply_markup=get_main_keyboard()
         )
\ No newline at end of file
@@ -2,13 +2,16 @@ import logging
 from telegram import Update
 from telegram.ext import CallbackContext
 
+from services.send_queue import send_queue
+
 logger = logging.getLogger(__name__)
 
 def error_handler(update: Update, context: CallbackContext):
     """Логирует ошибки, вызванные обработчиками."""
     logger.error("Ошибка при обработке запроса: %s", context.error, exc_info=True)
     if update and update.message:
-        update.message.reply_text(
+        send_queue.reply(
+            update.message,
             "❌ Произошла ошибка. Попробуйте снова или выберите другое действие.",
             # Для возврата кнопок: reply_markup=get_main_keyboard()
         )
\ No newline at end of file
@@ -0,0 +1,29 @@
+import logging
+from telegram import Update
+from telegram.ext import CallbackContext, DispatcherHandlerStop
+
+from config import USER_COMMAND_RATE, USER_COMMAND_BURST
+from services.rate_limit import UserRateLimiter
+from services.send_queue import send_queue, PRIORITY_LOW
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_TEXT = "⏳ Слишком много запросов. Подождите несколько секунд и попробуйте снова."
+
+user_limiter = UserRateLimiter(rate=USER_COMMAND_RATE, burst=USER_COMMAND_BURST)
+
+
+def throttle_updates(update: Update, context: CallbackContext) -> None:
+    """
+    Ограничивает частоту сообщений от одного пользователя (регистрируется в группе -1,
+    до остальных обработчиков). Сверх лимита обновление отбрасывается; предупреждение
+    отправляется один раз за серию отказов и с низким приоритетом.
+    """
+    user = update.effective_user
+    if user is None or user_limiter.allow(user.id):
+        return
+
+    logger.info(f"Пользователь {user.id} превысил лимит запросов")
+    if update.message and user_limiter.take_notice(user.id):
+        send_queue.reply(update.message, THROTTLE_TEXT, priority=PRIORITY_LOW)
+    raise DispatcherHandlerStop()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """
+    Цикл событий asyncio в отдельном потоке.
+    Потоки диспетчера только ставят корутины обработчиков в этот цикл и сразу освобождаются;
+    сетевые ожидания не занимают потоков. Оставшиеся блокирующие вызовы
+    (файлы, синхронный Bot API) выполняются в ограниченном пуле run_blocking.
+    """
+    def __init__(self, blocking_workers: int = 16):
+        self.blocking_workers = blocking_workers
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+        # Последняя поставленная корутина каждого ключа (меняется только в потоке цикла)
+        self._chains: Dict[Hashable, asyncio.Future] = {}
+        self._on_stop: List[Callable[[], Awaitable]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "AsyncRuntime":
+        """Запускает цикл событий (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self.running:
+                return self
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name="asyncio-runtime", daemon=True)
+            self._thread.start()
+        self._started.wait()
+        logger.info(f"Асинхронный режим запущен (блокирующий пул: {self.blocking_workers} потоков)")
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix="aio-blocking")
+        self.loop.set_default_executor(self._executor)
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+            self._executor.shutdown(wait=False)
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Ставит корутину в цикл из любого потока; ошибки записываются в лог."""
+        if not self.running:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def submit_ordered(self, key: Hashable, coro: Coroutine) -> Future:
+        """
+        Как submit, но корутины с одним ключом выполняются строго по очереди,
+        в порядке вызова submit_ordered (следующая начинается после завершения предыдущей).
+        """
+        return self.submit(self._chained(key, coro))
+
+    async def _chained(self, key: Hashable, coro: Coroutine) -> Any:
+        # До первого await: цикл запускает задачи в порядке постановки, поэтому очередь ключа
+        # выстраивается в том же порядке, в каком вызывался submit_ordered
+        previous = self._chains.get(key)
+        done = self._chains[key] = self.loop.create_future()
+        try:
+            if previous is not None:
+                await previous
+            return await coro
+        finally:
+            coro.close()
+            done.set_result(None)
+            if self._chains.get(key) is done:
+                del self._chains[key]
+
+    def on_stop(self, close: Callable[[], Awaitable]) -> None:
+        """Регистрирует корутинную функцию, которая выполнится в цикле при stop (например, закрытие сессии)."""
+        self._on_stop.append(close)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается начатых обработчиков (не дольше timeout), выполняет on_stop и останавливает цикл."""
+        if not self.running:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self.loop).result(timeout + 5)
+        except Exception as e:
+            logger.error(f"Ошибка остановки асинхронного режима: {e}", exc_info=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _shutdown(self, timeout: float) -> None:
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        for close in self._on_stop:
+            try:
+                await close()
+            except Exception as e:
+                logger.error(f"Ошибка при остановке асинхронного режима: {e}", exc_info=True)
+
+
+def _log_failure(future: Future) -> None:
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error("Ошибка в асинхронном обработчике: %s", error, exc_info=error)
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Выполняет блокирующую функцию в пуле потоков текущего цикла."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(fn, *args, **kwargs))
+
+
+# Глобальный экземпляр для асинхронного режима бота
+runtime = AsyncRuntime()
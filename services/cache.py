@@ -1,55 +1,375 @@
+import atexit
 import json
 import os
 import time
 import logging
-from typing import Dict, Any
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.storage import atomic_write_json
 
 logger = logging.getLogger(__name__)
 
+# Признак отсутствия ключа в кэше (None — допустимое значение: «не найдено»)
+MISSING = object()
+
+
+class LookupCache:
+    """
+    Ограниченный кэш в памяти с TTL и вытеснением по LRU.
+    Значение None хранится как отрицательный результат («не найдено»)
+    и живёт negative_ttl секунд, обычные значения — ttl секунд (если при записи
+    не задан свой срок). Сроки истечения — по времени time.time(), чтобы записи
+    можно было сохранить на диск и восстановить после перезапуска (см. CacheManager).
+    """
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, negative_ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Возвращает значение (в том числе None для отрицательного результата) или default."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if value is None:
+                self.negative_hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение; None означает «не найдено». ttl задаёт срок жизни именно этой записи."""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        self._put(key, time.time() + ttl, value)
+
+    def _put(self, key: str, expires_at: float, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Удаляет один ключ или весь кэш."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def items(self) -> List[Tuple[str, float, Any]]:
+        """Действующие записи (ключ, срок истечения, значение) от давних к недавним."""
+        now = time.time()
+        with self._lock:
+            return [(k, expires_at, v) for k, (expires_at, v) in self._data.items() if expires_at > now]
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики попаданий и промахов для мониторинга."""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
 
 class CacheManager:
-    """Простой менеджер кэша, сохраняющий данные в файл с ограничением по времени (TTL)."""
-    def __init__(self, cache_file="cache.json", ttl=3600):
+    """
+    Кэш LookupCache с сохранением на диск.
+    Чтение и запись — в памяти; на диск кэш сбрасывается снимком в фоне
+    (write-behind) не чаще раза в flush_interval секунд, при close() и при
+    завершении процесса, и загружается обратно при старте.
+    """
+    def __init__(self, cache_file="cache.json", ttl=3600, max_size=10000, flush_interval=30):
         self.cache_file = cache_file
         self.ttl = ttl  # Time To Live в секундах
+        self.flush_interval = flush_interval
+
+        self._cache = LookupCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flushes = 0
+
+        self._load_cache()
+
+        self._stop_event = threading.Event()
+        self._flusher = None
+        if self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, name="cache-flusher", daemon=True)
+            self._flusher.start()
+        # Изменения последнего интервала не теряются при штатной остановке
+        atexit.register(self.close)
 
     def get(self, key: str) -> Any:
-        """Получает значение из кэша."""
-        cache = self._load_cache()
-        if key in cache:
-            item = cache[key]
-            if time.time() - item.get('timestamp', 0) < self.ttl:
-                return item.get('data')
-        return None
-
-    def set(self, key: str, data: Any):
-        """Сохраняет значение в кэш."""
-        cache = self._load_cache()
-        cache[key] = {
-            'timestamp': time.time(),
-            'data': data
-        }
-        self._save_cache(cache)
-
-    def _load_cache(self) -> Dict:
-        """Загружает весь кэш из файла."""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Ошибка загрузки кэша: {e}")
-        return {}
-
-    def _save_cache(self, cache: Dict):
-        """Сохраняет кэш в файл."""
+        """Получает значение из кэша (None — нет или истекло)."""
+        return self._cache.get(key, None)
+
+    def set(self, key: str, data: Any, ttl: Optional[float] = None):
+        """Сохраняет значение в кэш; ttl задаёт срок жизни именно этой записи."""
+        self._cache.set(key, data, ttl=self.ttl if ttl is None else ttl)
+        self._mark_dirty()
+
+    def delete(self, key: str) -> None:
+        """Удаляет значение из кэша."""
+        self._cache.invalidate(key)
+        self._mark_dirty()
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        self._cache.invalidate()
+        self._mark_dirty()
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика попаданий, промахов и вытеснений."""
+        with self._lock:
+            flushes = self._flushes
+        return dict(self._cache.stats(), flushes=flushes)
+
+    def flush(self) -> None:
+        """Сохраняет снимок кэша на диск, если с прошлого сохранения были изменения."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        snapshot = {k: {'expires_at': expires_at, 'data': v} for k, expires_at, v in self._cache.items()}
+        # Сериализация и запись — вне блокировок, чтобы не задерживать get/set
+        if not self._save_cache(snapshot):
+            self._mark_dirty()
+
+    def close(self) -> None:
+        """Останавливает фоновое сохранение и сбрасывает изменения на диск."""
+        self._stop_event.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def _mark_dirty(self) -> None:
+        with self._lock:
+            self._dirty = True
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def _load_cache(self) -> None:
+        """Загружает сохранённый кэш при старте, пропуская устаревшие записи."""
+        if not os.path.exists(self.cache_file):
+            return
         try:
-            # Убедимся, что директория существует
-            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки кэша: {e}")
+            return
+
+        now = time.time()
+        items = []
+        for key, item in stored.items():
+            if not isinstance(item, dict):
+                continue
+            expires_at = item.get('expires_at')
+            if expires_at is None:
+                # Формат прежних версий: время записи и необязательный собственный ttl
+                expires_at = item.get('timestamp', 0) + item.get('ttl', self.ttl)
+            if expires_at > now:
+                items.append((expires_at, key, item.get('data')))
+        # Порядок LRU восстанавливается приблизительно: по сроку истечения
+        for expires_at, key, data in sorted(items, key=lambda item: item[0]):
+            self._cache._put(key, expires_at, data)
+        logger.info(f"Кэш загружен из {self.cache_file}: {self._cache.stats()['size']} записей")
+
+    def _save_cache(self, cache: Dict) -> bool:
+        """Сохраняет кэш в файл атомарно."""
+        try:
+            atomic_write_json(self.cache_file, cache)
+            with self._lock:
+                self._flushes += 1
+            return True
         except Exception as e:
             logger.error(f"Ошибка сохранения кэша: {e}")
+            return False
+
+
+class SQLiteCacheManager:
+    """
+    Кэш во встроенной базе SQLite (режим WAL) с тем же интерфейсом, что у CacheManager.
+    Несколько кэшей делят одну базу через namespace. Одна строка на ключ с собственным сроком истечения, запись — upsert одной строки,
+    поиск — по первичному ключу. Базу могут одновременно использовать несколько
+    процессов бота на одном сервере. Просроченные строки периодически удаляются.
+    """
+    def __init__(self, db_file="cache.sqlite3", ttl=3600, namespace="default", vacuum_interval=600):
+        self.db_file = db_file
+        self.namespace = namespace
+        self.ttl = ttl
+        self.vacuum_interval = vacuum_interval
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expirations": 0, "vacuums": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        conn.commit()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # База создана без инкрементальной очистки (например, старой версией): перестраиваем один раз
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+
+        self._stop_event = threading.Event()
+        self._vacuumer = None
+        if self.vacuum_interval:
+            self._vacuumer = threading.Thread(target=self._vacuum_loop, name="cache-vacuum", daemon=True)
+            self._vacuumer.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Отдельное соединение на поток: sqlite3.Connection нельзя делить между потоками."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            # auto_vacuum действует только для пустой базы и должен идти до journal_mode:
+            # переключение в WAL уже создаёт файл базы
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, key: str) -> Any:
+        """Получает значение из кэша."""
+        try:
+            row = self._connection().execute(
+                "SELECT expires_at, data FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения кэша SQLite: {e}")
+            return None
+        if row is None:
+            self._count("misses")
+            return None
+        if row[0] <= time.time():
+            self._count("expirations")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(row[1])
+
+    def set(self, key: str, data: Any, ttl: Optional[float] = None):
+        """Сохраняет значение в кэш (upsert одной строки)."""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO cache (namespace, key, expires_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET expires_at = excluded.expires_at, data = excluded.data",
+                (self.namespace, key, expires_at, payload),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи кэша SQLite: {e}")
+
+    def delete(self, key: str) -> None:
+        """Удаляет значение из кэша."""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+        conn.commit()
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+        conn.commit()
+
+    def vacuum(self) -> int:
+        """Удаляет просроченные строки (всех пространств имён) и возвращает место файлу базы."""
+        conn = self._connection()
+        deleted = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        conn.commit()
+        # Через execute() модуль sqlite3 делает один шаг прагмы и освобождает одну страницу;
+        # executescript выполняет её до конца
+        conn.executescript("PRAGMA incremental_vacuum;")
+        self._count("vacuums")
+        if deleted:
+            logger.info(f"Из кэша SQLite удалено просроченных записей: {deleted}")
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика попаданий и промахов; size — число строк этого кэша в базе."""
+        with self._stats_lock:
+            result = dict(self._stats)
+        try:
+            result["size"] = self._connection().execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            pass
+        return result
+
+    def flush(self) -> None:
+        """Каждая запись фиксируется сразу; метод нужен для совместимости с CacheManager."""
+
+    def close(self) -> None:
+        self._stop_event.set()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _vacuum_loop(self) -> None:
+        while not self._stop_event.wait(self.vacuum_interval):
+            try:
+                self.vacuum()
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка очистки кэша SQLite: {e}")
+
+
+def create_cache_manager(name: str, ttl: Optional[float] = None):
+    """
+    Создаёт кэш с бэкендом из config.py (CACHE_BACKEND = "memory" | "sqlite").
+    name — имя кэша: файл name.json или таблица в общей базе CACHE_DB_FILE.
+    """
+    from config import CACHE_BACKEND, CACHE_DIR, CACHE_DB_FILE, CACHE_TTL
+
+    ttl = CACHE_TTL if ttl is None else ttl
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteCacheManager(db_file=CACHE_DB_FILE, ttl=ttl, namespace=name)
+    return CacheManager(cache_file=os.path.join(CACHE_DIR, f"{name}.json"), ttl=ttl)
 
 
 # Создаем глобальный экземпляр кэша (если он нужен)
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# aiohttp импортируется при первом асинхронном запросе: синхронному режиму он не нужен,
+# а его загрузка заметно удлиняет запуск бота
+_aiohttp = None
+_aiohttp_checked = False
+
+
+def _import_aiohttp():
+    """Модуль aiohttp или None, если он не установлен (тогда работает пул потоков)."""
+    global _aiohttp, _aiohttp_checked
+    if not _aiohttp_checked:
+        try:
+            import aiohttp
+            _aiohttp = aiohttp
+        except ImportError:
+            _aiohttp = None
+        _aiohttp_checked = True
+    return _aiohttp
+
+# Статусы, после которых повтор запроса имеет смысл
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Запрос не отправлен: автомат разомкнут после серии ошибок."""
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель.
+    После failure_threshold ошибок подряд размыкается и отклоняет запросы;
+    через recovery_timeout пропускает один пробный запрос (half-open)
+    и по его результату замыкается или снова размыкается.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Автомат API замкнут: сервис снова отвечает")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        f"Автомат API разомкнут после {self.consecutive_failures} ошибок подряд, "
+                        f"повторная проверка через {self.recovery_timeout} с"
+                    )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ApiClient:
+    """
+    HTTP-клиент для внешнего API с общим пулом keep-alive соединений,
+    ограниченным числом повторов с джиттером, общим дедлайном на вызов
+    и автоматическим выключателем.
+    """
+    def __init__(self, base_url: str, timeout: float = 10.0, retries: int = 2,
+                 backoff: float = 0.3, max_backoff: float = 2.0, pool_size: int = 10,
+                 breaker: Optional[CircuitBreaker] = None, headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._counters = {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "short_circuits": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._stats_lock:
+            self._latencies.append(seconds)
+
+    def _sleep_before_retry(self, attempt: int, deadline: float) -> bool:
+        """Пауза с экспоненциальным ростом и полным джиттером. False — не успеваем до дедлайна."""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def get(self, path: str, params: Optional[Dict] = None, timeout: Optional[float] = None,
+            deadline: Optional[float] = None, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        GET-запрос к base_url + path.
+        timeout — ограничение на одну попытку, deadline — на весь вызов с повторами (секунды).
+        Возвращает ответ с любым окончательным статусом; при недоступности сервиса
+        бросает requests.exceptions.RequestException (в том числе CircuitOpenError).
+        """
+        timeout = timeout or self.timeout
+        call_deadline = time.monotonic() + (deadline or timeout * (self.retries + 1))
+        url = f"{self.base_url}{path}"
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self._count("short_circuits")
+                raise CircuitOpenError(f"API временно отключён после серии ошибок: {url}")
+
+            remaining = call_deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            started = time.monotonic()
+            self._count("requests")
+            try:
+                response = self.session.get(url, params=params, headers=headers,
+                                            timeout=min(timeout, remaining))
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                self.breaker.record_failure()
+                self._count("failures")
+            else:
+                self._record_latency(time.monotonic() - started)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    self._count("successes")
+                    return response
+                self.breaker.record_failure()
+                self._count("failures")
+                last_error = requests.exceptions.HTTPError(
+                    f"Статус {response.status_code} от {url}", response=response
+                )
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit() and attempt < self.retries:
+                    if time.monotonic() + int(retry_after) < call_deadline:
+                        time.sleep(int(retry_after))
+                        self._count("retries")
+                        continue
+                    break
+
+            if attempt >= self.retries or not self._sleep_before_retry(attempt, call_deadline):
+                break
+            self._count("retries")
+            logger.info(f"Повтор запроса к {url} (попытка {attempt + 2})")
+
+        raise last_error or requests.exceptions.Timeout(f"Истёк дедлайн запроса к {url}")
+
+    def stats(self) -> Dict:
+        """Счётчики ошибок, задержки и состояние автомата для мониторинга."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            result = dict(self._counters)
+        result["circuit_state"] = self.breaker.state
+        result["consecutive_failures"] = self.breaker.consecutive_failures
+        if latencies:
+            result["latency_avg"] = sum(latencies) / len(latencies)
+            result["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            result["latency_max"] = latencies[-1]
+        return result
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncApiClient:
+    """
+    Асинхронный клиент к тому же API.
+    При наличии aiohttp запросы идут через общий aiohttp.ClientSession в цикле событий;
+    без него вызовы синхронного ApiClient выполняются в пуле потоков цикла.
+    Автоматический выключатель общий с синхронным клиентом.
+    """
+    def __init__(self, sync_client: ApiClient, pool_size: int = 100):
+        self.sync_client = sync_client
+        self.breaker = sync_client.breaker
+        self.pool_size = pool_size
+        self._session = None
+
+    async def _get_session(self, aiohttp):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=dict(self.sync_client.session.headers),
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+            )
+        return self._session
+
+    async def get_json(self, path: str, params: Optional[Dict] = None, timeout: Optional[float] = None,
+                       deadline: Optional[float] = None) -> Tuple[int, Any]:
+        """
+        GET-запрос, возвращает (статус, JSON или None).
+        Повторы, дедлайн и выключатель — как у ApiClient.get.
+        """
+        aiohttp = _import_aiohttp()
+        if aiohttp is None:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                None, lambda: self.sync_client.get(path, params=params, timeout=timeout, deadline=deadline)
+            )
+            return response.status_code, response.json() if response.status_code == 200 else None
+
+        client = self.sync_client
+        timeout = timeout or client.timeout
+        call_deadline = time.monotonic() + (deadline or timeout * (client.retries + 1))
+        url = f"{client.base_url}{path}"
+        session = await self._get_session(aiohttp)
+        last_error: Optional[Exception] = None
+
+        for attempt in range(client.retries + 1):
+            if not self.breaker.allow():
+                client._count("short_circuits")
+                raise CircuitOpenError(f"API временно отключён после серии ошибок: {url}")
+
+            remaining = call_deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            started = time.monotonic()
+            client._count("requests")
+            try:
+                async with session.get(url, params=params,
+                                       timeout=aiohttp.ClientTimeout(total=min(timeout, remaining))) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    data = await response.json(content_type=None) if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                last_error = requests.exceptions.ConnectionError(f"{url}: {e!r}")
+                self.breaker.record_failure()
+                client._count("failures")
+            else:
+                client._record_latency(time.monotonic() - started)
+                if status not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    client._count("successes")
+                    return status, data
+                self.breaker.record_failure()
+                client._count("failures")
+                last_error = requests.exceptions.HTTPError(f"Статус {status} от {url}")
+                if retry_after and retry_after.isdigit() and attempt < client.retries:
+                    if time.monotonic() + int(retry_after) < call_deadline:
+                        await asyncio.sleep(int(retry_after))
+                        client._count("retries")
+                        continue
+                    break
+
+            if attempt >= client.retries:
+                break
+            delay = random.uniform(0, min(client.max_backoff, client.backoff * (2 ** attempt)))
+            if time.monotonic() + delay >= call_deadline:
+                break
+            await asyncio.sleep(delay)
+            client._count("retries")
+
+        raise last_error or requests.exceptions.Timeout(f"Истёк дедлайн запроса к {url}")
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
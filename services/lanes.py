@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from services.send_queue import send_queue
+from services.workers import shard_key
+
+logger = logging.getLogger(__name__)
+
+BUSY_TEXT = "⏳ Бот сейчас перегружен. Попробуйте, пожалуйста, ещё раз через минуту."
+
+# Задача полосы: (время постановки, обновление, контекст, обработчик)
+_Job = Tuple[float, Update, CallbackContext, Callable]
+
+
+class Lane:
+    """
+    Полоса обработки: свой ограниченный пул потоков и ограниченная очередь.
+    Если очередь полна, новое обновление сразу отклоняется; если обновление
+    прождало в очереди дольше timeout, оно не выполняется (пользователь, скорее всего,
+    уже повторил запрос). В обоих случаях пользователь получает короткий ответ «занято».
+    Очередностью обновлений одного пользователя управляет LaneRouter.
+    """
+    def __init__(self, name: str, workers: int, max_queue: int, timeout: float):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"lane-{name}")
+        # pending, accepted и shed меняются под блокировкой LaneRouter; остальное — статистика
+        self.pending = 0
+        self.counters = {"accepted": 0, "shed": 0, "expired": 0, "failed": 0, "slow": 0}
+
+    def run(self, job: _Job) -> None:
+        """Выполняет обработчик в текущем потоке полосы."""
+        queued_at, update, context, callback = job
+        started = time.monotonic()
+        if started - queued_at > self.timeout:
+            self.counters["expired"] += 1
+            logger.warning(f"Полоса {self.name}: обновление прождало {started - queued_at:.1f} с и пропущено")
+            reply_busy(update)
+            return
+        try:
+            callback(update, context)
+        except Exception as e:
+            self.counters["failed"] += 1
+            context.dispatcher.dispatch_error(update, e)
+        elapsed = time.monotonic() - started
+        if elapsed > self.timeout:
+            # Поток нельзя прервать: долгие обработчики только отмечаются в логе и статистике
+            self.counters["slow"] += 1
+            logger.warning(f"Полоса {self.name}: {callback.__name__} выполнялся {elapsed:.1f} с")
+
+    def stats(self) -> Dict:
+        return {**self.counters, "pending": self.pending, "workers": self.workers}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+
+
+def reply_busy(update: Update) -> None:
+    if update.effective_message is not None:
+        send_queue.reply(update.effective_message, BUSY_TEXT)
+
+
+class LaneRouter:
+    """
+    Распределяет обработчики по полосам: быстрые команды не ждут за медленными.
+    route() и route_by() оборачивают обработчик так, что поток диспетчера только
+    ставит его в полосу. Обновления одного пользователя (в группе — одного чата, см.
+    shard_key) выполняются строго по очереди даже в разных полосах: пока выполняется
+    задача, следующие ждут в цепочке и затем переходят в пул своей полосы. Поэтому диалог
+    (/top без аргументов, затем ответ текстом) не перемешивается.
+    """
+    def __init__(self):
+        self.lanes: Dict[str, Lane] = {}
+        self._lock = threading.Lock()
+        self._chains: Dict[int, Deque[Tuple[Lane, _Job]]] = {}
+
+    def add_lane(self, name: str, workers: int, max_queue: int, timeout: float) -> Lane:
+        lane = self.lanes[name] = Lane(name, workers, max_queue, timeout)
+        logger.info(f"Полоса {name}: {workers} потоков, очередь {max_queue}, таймаут {timeout} с")
+        return lane
+
+    def route(self, lane_name: str, callback: Callable) -> Callable:
+        """Обработчик, который всегда выполняется в полосе lane_name."""
+        return self.route_by(lambda update, context: lane_name, callback)
+
+    def route_by(self, classify: Callable[[Update, CallbackContext], str], callback: Callable) -> Callable:
+        """Обработчик, полоса которого выбирается по обновлению (в потоке диспетчера)."""
+        def routed(update: Update, context: CallbackContext) -> None:
+            lane = self.lanes[classify(update, context)]
+            if not self.submit(lane, update, context, callback):
+                logger.warning(f"Полоса {lane.name} переполнена, {callback.__name__} отклонён")
+                reply_busy(update)
+        routed.__name__ = callback.__name__
+        return routed
+
+    def submit(self, lane: Lane, update: Update, context: CallbackContext, callback: Callable) -> bool:
+        """Ставит обработчик в полосу. False — очередь полосы полна, обновление отклонено."""
+        key = shard_key(update)
+        job = (time.monotonic(), update, context, callback)
+        with self._lock:
+            if lane.pending >= lane.max_queue:
+                lane.counters["shed"] += 1
+                return False
+            lane.pending += 1
+            lane.counters["accepted"] += 1
+            chain = self._chains.get(key)
+            if chain is not None:
+                # У пользователя уже есть задача в работе: эта выполнится следом
+                chain.append((lane, job))
+                return True
+            self._chains[key] = deque()
+        lane.executor.submit(self._run_chain, key, lane, job)
+        return True
+
+    def _run_chain(self, key: int, lane: Lane, job: _Job) -> None:
+        while True:
+            lane.run(job)
+            with self._lock:
+                lane.pending -= 1
+                chain = self._chains[key]
+                if not chain:
+                    del self._chains[key]
+                    return
+                next_lane, job = chain.popleft()
+            if next_lane is not lane:
+                # Следующая задача пользователя — в другой полосе: передаём её пулу той полосы
+                next_lane.executor.submit(self._run_chain, key, next_lane, job)
+                return
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        for lane in self.lanes.values():
+            lane.shutdown(wait=wait)
+
+
+# Глобальный маршрутизатор процесса (полосы создаются при запуске бота)
+lane_router = LaneRouter()
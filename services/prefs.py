@@ -1,13 +1,20 @@
+import atexit
 import json
 import os
 import logging
-from typing import Dict
+import sqlite3
+import threading
+from typing import Dict, Optional
 
 # Должен быть в config.py
-from config import PREFS_FILE
+from config import PREFS_FILE, PREFS_BACKEND, PREFS_DB_FILE
+from utils.storage import atomic_write_text
 
 logger = logging.getLogger(__name__)
 
+# Как часто (в секундах) изменённые настройки сбрасываются на диск
+PREFS_FLUSH_INTERVAL = 5
+
 
 def load_prefs() -> Dict[str, Dict]:
     """Загружает настройки пользователей из файла PREFS_FILE."""
@@ -22,26 +29,195 @@ def load_prefs() -> Dict[str, Dict]:
 
 
 def save_prefs(prefs: Dict[str, Dict]) -> None:
-    """Сохраняет настройки пользователей в файл PREFS_FILE."""
+    """Сохраняет настройки пользователей в файл PREFS_FILE атомарно (временный файл и rename)."""
     try:
-        # Убедимся, что директория существует (например, папка 'data')
-        os.makedirs(os.path.dirname(PREFS_FILE) or '.', exist_ok=True)
-
-        with open(PREFS_FILE, "w", encoding="utf-8") as f:
-            json.dump(prefs, f, ensure_ascii=False, indent=2)
+        atomic_write_text(PREFS_FILE, json.dumps(prefs, ensure_ascii=False, indent=2))
     except Exception as e:
         logger.error("Ошибка при сохранении настроек пользователей: %s", e)
 
 
+class PrefsStore:
+    """
+    Настройки пользователей в памяти.
+    Файл читается один раз; чтение — поиск в словаре, запись помечает хранилище
+    изменённым, а фоновый поток раз в flush_interval секунд сохраняет все накопленные
+    изменения одной атомарной записью.
+    """
+    def __init__(self, flush_interval: float = PREFS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._prefs: Optional[Dict[str, Dict]] = None
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def _data(self) -> Dict[str, Dict]:
+        if self._prefs is None:
+            with self._lock:
+                if self._prefs is None:
+                    self._prefs = load_prefs()
+                    logger.info("Настройки загружены: %d пользователей", len(self._prefs))
+        return self._prefs
+
+    def get(self, user_id: int) -> Dict[str, str]:
+        """Копия настроек пользователя."""
+        data = self._data()
+        with self._lock:
+            return dict(data.get(str(user_id), {}))
+
+    def set(self, user_id: int, key: str, value: str) -> None:
+        data = self._data()
+        with self._lock:
+            data.setdefault(str(user_id), {})[key] = value
+            self._dirty = True
+        self._ensure_flusher()
+
+    def flush(self) -> None:
+        """Сохраняет изменения на диск, если они есть."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._prefs, ensure_ascii=False, indent=2)
+            self._dirty = False
+        try:
+            atomic_write_text(PREFS_FILE, payload)
+        except Exception as e:
+            logger.error("Ошибка при сохранении настроек пользователей: %s", e)
+            with self._lock:
+                self._dirty = True
+
+    def close(self) -> None:
+        """Останавливает фоновое сохранение и записывает оставшиеся изменения."""
+        self._stop_event.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="prefs-flusher", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+
+class SQLitePrefsStore:
+    """
+    Настройки пользователей в SQLite (режим WAL): одна строка на пару (пользователь, ключ).
+    Изменение настройки — upsert одной строки, чтение — выборка по индексу user_id,
+    поэтому базу безопасно делят несколько процессов бота.
+    При первом запуске настройки переносятся из JSON-файла PREFS_FILE.
+    """
+    def __init__(self, db_file: str = PREFS_DB_FILE, json_file: str = PREFS_FILE):
+        self.db_file = db_file
+        self.json_file = json_file
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS prefs ("
+            " user_id TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (user_id, key))"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        conn.commit()
+        self._migrate_from_json()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_from_json(self) -> None:
+        """Однократно переносит настройки из JSON; отметка о переносе хранится в таблице meta."""
+        conn = self._connection()
+        # BEGIN IMMEDIATE: если процессы стартуют одновременно, перенос выполнит только один
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT 1 FROM meta WHERE name = 'json_migrated'").fetchone()
+            if not done:
+                prefs = {}
+                if os.path.exists(self.json_file):
+                    try:
+                        with open(self.json_file, "r", encoding="utf-8") as f:
+                            prefs = json.load(f)
+                    except Exception as e:
+                        logger.error("Ошибка при чтении %s для переноса: %s", self.json_file, e)
+                rows = [
+                    (str(user_id), str(key), str(value))
+                    for user_id, user_prefs in prefs.items() if isinstance(user_prefs, dict)
+                    for key, value in user_prefs.items()
+                ]
+                conn.executemany("INSERT OR IGNORE INTO prefs (user_id, key, value) VALUES (?, ?, ?)", rows)
+                conn.execute("INSERT INTO meta (name, value) VALUES ('json_migrated', '1')")
+                logger.info("Настройки перенесены из %s в SQLite: %d записей", self.json_file, len(rows))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def get(self, user_id: int) -> Dict[str, str]:
+        rows = self._connection().execute(
+            "SELECT key, value FROM prefs WHERE user_id = ?", (str(user_id),)
+        ).fetchall()
+        return dict(rows)
+
+    def set(self, user_id: int, key: str, value: str) -> None:
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO prefs (user_id, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, key) DO UPDATE SET value = excluded.value",
+            (str(user_id), key, value),
+        )
+        conn.commit()
+
+    def flush(self) -> None:
+        """Каждое изменение фиксируется сразу; метод нужен для совместимости с PrefsStore."""
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_prefs_store():
+    """Хранилище настроек по PREFS_BACKEND из config.py: "json" (по умолчанию) или "sqlite"."""
+    if PREFS_BACKEND == "sqlite":
+        return SQLitePrefsStore()
+    return PrefsStore()
+
+
+# Глобальное хранилище настроек процесса
+prefs_store = create_prefs_store()
+
+
 def set_user_pref(user_id: int, key: str, value: str) -> None:
     """Устанавливает или обновляет настройку для конкретного пользователя."""
-    prefs = load_prefs()
-    user_key = str(user_id)
-    prefs.setdefault(user_key, {})[key] = value
-    save_prefs(prefs)
+    prefs_store.set(user_id, key, value)
 
 
 def get_user_prefs(user_id: int) -> Dict[str, str]:
     """Возвращает все настройки для конкретного пользователя."""
-    prefs = load_prefs()
-    return prefs.get(str(user_id), {})
\ No newline at end of file
+    return prefs_store.get(user_id)
+
+
+def flush_prefs() -> None:
+    """Немедленно сохраняет изменённые настройки (например, при остановке бота)."""
+    prefs_store.flush()
+
+
+# Изменения, накопленные за последний интервал, не теряются при штатной остановке
+atexit.register(flush_prefs)
@@ -0,0 +1,82 @@
+import logging
+import random
+import threading
+from collections import OrderedDict, deque
+from typing import Optional
+
+from services.registry import CountryRegistry, country_registry
+from utils.country import Country
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних показанных стран не повторяется для одного пользователя
+RANDOM_HISTORY_SIZE = 20
+# Для скольких пользователей хранится история (самые давние вытесняются)
+RANDOM_MAX_USERS = 10000
+# Попыток случайного выбора до перехода к явному исключению недавних стран
+_MAX_REDRAWS = 8
+
+
+class RandomCountryPicker:
+    """
+    Случайная страна из загруженного в память набора: без сети и диска.
+    Выбор равномерный или с весом по населению, по всему набору или по региону.
+    Для каждого пользователя хранится кольцевой буфер недавно показанных стран,
+    которые не выпадают повторно, пока в пуле есть другие.
+    """
+    def __init__(self, registry: CountryRegistry = country_registry,
+                 history_size: int = RANDOM_HISTORY_SIZE, max_users: int = RANDOM_MAX_USERS,
+                 rng: Optional[random.Random] = None):
+        self.registry = registry
+        self.history_size = history_size
+        self.max_users = max_users
+        self._rng = rng or random.Random()
+        self._history: "OrderedDict[int, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, user_id: int) -> deque:
+        history = self._history.get(user_id)
+        if history is None:
+            history = self._history[user_id] = deque(maxlen=self.history_size)
+            if len(self._history) > self.max_users:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(user_id)
+        return history
+
+    def pick(self, user_id: int, weighted: bool = False, region: Optional[str] = None) -> Optional[Country]:
+        """Случайная страна для пользователя или None, если пул пуст (нет данных или такого региона)."""
+        countries, cum_weights = self.registry.sampling_pool(region)
+        if not countries:
+            return None
+
+        with self._lock:
+            recent = self._recent(user_id)
+            # Нельзя исключить больше, чем есть стран: хотя бы одна должна остаться
+            excluded = set(list(recent)[-(len(countries) - 1):]) if len(countries) > 1 else set()
+
+            country = None
+            for _ in range(_MAX_REDRAWS):
+                candidate = self._draw(countries, cum_weights, weighted)
+                if candidate.name not in excluded:
+                    country = candidate
+                    break
+
+            if country is None:
+                # Недавних стран слишком много в пуле: выбираем среди оставшихся
+                remaining = [i for i, c in enumerate(countries) if c.name not in excluded]
+                weights = [cum_weights[i] - (cum_weights[i - 1] if i else 0) for i in remaining]
+                index = self._rng.choices(remaining, weights=weights if weighted else None)[0]
+                country = countries[index]
+
+            recent.append(country.name)
+        return country
+
+    def _draw(self, countries, cum_weights, weighted: bool) -> Country:
+        if weighted:
+            return self._rng.choices(countries, cum_weights=cum_weights)[0]
+        return self._rng.choice(countries)
+
+
+# Глобальный экземпляр для обработчиков /random
+random_picker = RandomCountryPicker()
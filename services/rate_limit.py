@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Ведро токенов: в среднем rate событий в секунду, кратковременно — до burst подряд.
+    Не потокобезопасно само по себе: вызывающий код держит свою блокировку.
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Через сколько секунд будет доступен токен (0 — уже сейчас)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: Optional[float] = None) -> None:
+        """Забирает токен (баланс может уйти в минус, если не проверить delay)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """Забирает токен, если он есть."""
+        now = time.monotonic() if now is None else now
+        if self.delay(now) > 0:
+            return False
+        self.consume(now)
+        return True
+
+
+class UserRateLimiter:
+    """
+    Ограничение входящих команд: отдельное ведро токенов на каждого пользователя.
+    Хранит вёдра для max_users последних пользователей (самые давние вытесняются).
+    """
+    def __init__(self, rate: float = 1.0, burst: int = 5, max_users: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # Пользователи, которым уже сообщили об ограничении в текущей серии отказов
+        self._notified = set()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, user_id: int) -> bool:
+        """Можно ли обработать очередную команду пользователя."""
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_users:
+                    evicted, _ = self._buckets.popitem(last=False)
+                    self._notified.discard(evicted)
+            else:
+                self._buckets.move_to_end(user_id)
+
+            if bucket.try_acquire():
+                self._notified.discard(user_id)
+                return True
+            self.rejected += 1
+            return False
+
+    def take_notice(self, user_id: int) -> bool:
+        """True один раз за серию отказов: чтобы предупредить пользователя, не отвечая на каждый спам."""
+        with self._lock:
+            if user_id in self._notified:
+                return False
+            self._notified.add(user_id)
+            return True
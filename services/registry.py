@@ -0,0 +1,283 @@
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from services.search import FuzzyIndex, MIN_PREFIX_LENGTH
+from utils.country import Country
+
+if TYPE_CHECKING:
+    from utils.table import CountryTable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(name: str) -> str:
+    """Приводит название страны к ключу индекса: без регистра, диакритики и лишних пробелов."""
+    if not name:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(name))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.split()).casefold()
+
+
+# Метрики для /top — числовые колонки utils.table.CountryTable
+RANKING_METRICS = ("population", "area", "density")
+
+
+def _keys_signature(countries: List[Country]) -> Tuple:
+    """Всё, от чего зависят индексы поиска."""
+    return tuple((c.name, c.official_name, c.cca2, c.cca3, c.alt_spellings) for c in countries)
+
+
+def _ranking_signature(countries: List[Country]) -> Tuple:
+    """Всё, от чего зависят рейтинги /top."""
+    return tuple((c.name, c.region, c.population, c.area) for c in countries)
+
+
+class _Snapshot:
+    """
+    Неизменяемый снимок набора данных вместе с индексами и колоночной таблицей для рейтингов.
+    Таблица (и вместе с ней NumPy) строится при первом обращении, чтобы не замедлять
+    поиск по названию; сервис данных обращается к ней сразу после загрузки,
+    в фоновом потоке (см. restcountries._build_rankings_table).
+    Если передан предыдущий снимок, неизменившиеся части берутся из него: индексы —
+    когда не менялись названия и коды, таблица и номер версии рейтингов — когда
+    не менялись население, площадь и регионы.
+    """
+    __slots__ = ("countries", "index", "fuzzy", "_table", "_columns", "version",
+                 "rankings_version", "keys_signature", "ranking_signature", "_pools", "_regions")
+
+    def __init__(self, countries: List[Country], version: int = 0, previous: Optional["_Snapshot"] = None,
+                 columns: Optional[Dict[str, memoryview]] = None):
+        self.countries = countries
+        # Числовые колонки двоичного снимка (mmap), если набор прочитан из него
+        self._columns = columns
+        self.version = version
+        self._pools: Dict[Optional[str], Tuple[List[Country], List[int]]] = {}
+        self._regions: Optional[List[str]] = None
+        self.keys_signature = _keys_signature(countries)
+        self.ranking_signature = _ranking_signature(countries)
+
+        if previous is not None and previous.keys_signature == self.keys_signature:
+            # Те же ключи в том же порядке: заменяем в индексах только сами записи
+            replacements = {id(old): new for old, new in zip(previous.countries, countries) if old is not new}
+            self.index = {key: replacements.get(id(c), c) for key, c in previous.index.items()}
+            self.fuzzy = previous.fuzzy.with_countries(replacements) if replacements else previous.fuzzy
+        else:
+            self.index = _build_index(countries)
+            self.fuzzy = FuzzyIndex(self.index.items())
+
+        if previous is not None and previous.ranking_signature == self.ranking_signature:
+            self._table = previous._table
+            self.rankings_version = previous.rankings_version
+        else:
+            self._table = None
+            self.rankings_version = version
+
+    @property
+    def regions(self) -> List[str]:
+        if self._regions is None:
+            self._regions = sorted({c.region for c in self.countries if c.region})
+        return self._regions
+
+    def pool(self, region: Optional[str]) -> Tuple[List[Country], List[int]]:
+        """
+        Страны для случайного выбора (все или одного региона, без учёта регистра)
+        и накопленные суммы населения для выбора с весами. Строится при первом обращении.
+        """
+        key = region.casefold() if region else None
+        pool = self._pools.get(key)
+        if pool is None:
+            countries = [c for c in self.countries if key is None or c.region.casefold() == key]
+            cum_weights, total = [], 0
+            for country in countries:
+                # Страны без данных о населении всё же могут выпасть
+                total += max(country.population or 0, 1)
+                cum_weights.append(total)
+            pool = self._pools[key] = (countries, cum_weights)
+        return pool
+
+    @property
+    def table(self) -> "CountryTable":
+        if self._table is None:
+            from utils.table import CountryTable
+            # Повторное построение при гонке безвредно: результат одинаковый
+            if self._columns is not None:
+                self._table = CountryTable.from_snapshot(self.countries, self._columns)
+            else:
+                self._table = CountryTable.from_countries(self.countries)
+        return self._table
+
+
+def _build_index(countries: List[Country]) -> Dict[str, Country]:
+    """
+    Строит хэш-индекс по названиям и кодам.
+    Порядок проходов задаёт приоритет: общее название важнее официального,
+    официальное важнее кодов, коды важнее альтернативных написаний.
+    """
+    index: Dict[str, Country] = {}
+
+    def add(key, country):
+        # Ключи интернируются: те же строки используются во всех снимках и в нечётком индексе
+        key = sys.intern(normalize_name(key)) if key else ""
+        if key:
+            index.setdefault(key, country)
+
+    for country in countries:
+        add(country.name, country)
+    for country in countries:
+        add(country.official_name, country)
+    for country in countries:
+        add(country.cca2, country)
+        add(country.cca3, country)
+    for country in countries:
+        for alt in country.alt_spellings:
+            add(alt, country)
+
+    return index
+
+
+class CountryRegistry:
+    """
+    Общий для процесса реестр стран.
+    Данные загружаются один раз, поиск по названию — O(1) без обращения к диску.
+    При обновлении набора индексы строятся заново и подменяются атомарно.
+    """
+    def __init__(self):
+        self._snapshot = _Snapshot([])
+        self._version = 0
+        self._loaded = False
+        self._updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._listeners: List[Callable[[List[Country]], None]] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def version(self) -> int:
+        """Номер текущего снимка; меняется при каждой загрузке данных."""
+        return self._snapshot.version
+
+    @property
+    def rankings_version(self) -> int:
+        """Номер снимка, в котором последний раз менялись данные рейтингов."""
+        return self._snapshot.rankings_version
+
+    @property
+    def age(self) -> Optional[float]:
+        """Возраст данных в секундах или None, если время обновления неизвестно."""
+        if self._updated_at is None:
+            return None
+        return max(0.0, time.time() - self._updated_at)
+
+    def load(self, countries: List, updated_at: Optional[float] = None) -> None:
+        """
+        Заменяет набор данных; читатели видят либо старый, либо новый снимок целиком.
+        countries — объекты REST Countries (словари) или готовые записи Country.
+        updated_at — время актуальности данных (по умолчанию — текущее).
+        Для списка из двоичного снимка (utils.snapshot.SnapshotCountries) таблица рейтингов
+        строится поверх его числовых колонок в mmap.
+        """
+        columns = getattr(countries, "columns", None)
+        countries = [
+            c if isinstance(c, Country) else Country.from_dict(c)
+            for c in (countries or []) if isinstance(c, (dict, Country))
+        ]
+        # Загрузки выполняются по одной: снимок строится от текущего и подменяет именно его,
+        # поэтому номера версий не убывают, а подписчики получают наборы в том же порядке
+        with self._swap_lock:
+            self._version += 1
+            snapshot = _Snapshot(countries, self._version, previous=self._snapshot, columns=columns)
+            with self._lock:
+                self._snapshot = snapshot
+                self._updated_at = time.time() if updated_at is None else updated_at
+                self._loaded = True
+            logger.info(f"Реестр стран обновлён: {len(countries)} стран, {len(snapshot.index)} ключей")
+
+            for listener in list(self._listeners):
+                try:
+                    listener(countries)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика загрузки реестра: {e}", exc_info=True)
+
+    def on_load(self, listener: Callable[[List[Country]], None]) -> None:
+        """
+        Подписывает listener на загрузку данных: он вызывается с новым списком стран
+        после каждой подмены снимка (например, чтобы пересобрать готовые ответы).
+        Если данные уже загружены, listener сразу вызывается для текущего набора.
+        """
+        self._listeners.append(listener)
+        if self._loaded:
+            listener(self._snapshot.countries)
+
+    def touch(self, updated_at: Optional[float] = None) -> None:
+        """Отмечает текущие данные как актуальные без перестроения индексов."""
+        self._updated_at = time.time() if updated_at is None else updated_at
+
+    def ensure_loaded(self, loader: Callable[[], Tuple[Optional[List], Optional[float]]]) -> None:
+        """Однократно загружает данные через loader, возвращающий (страны, время актуальности)."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                countries, updated_at = loader()
+                self.load(countries or [], updated_at=updated_at)
+
+    def lookup(self, name: str) -> Optional[Country]:
+        """Ищет страну по названию, официальному названию, коду или альтернативному написанию."""
+        return self._snapshot.index.get(normalize_name(name))
+
+    def search(self, name: str) -> Optional[Country]:
+        """Точный поиск, а при промахе — однозначное нечёткое совпадение или совпадение по префиксу."""
+        snapshot = self._snapshot
+        key = normalize_name(name)
+        return snapshot.index.get(key) or snapshot.fuzzy.best_match(key)
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        """Список названий для подсказки «возможно, вы имели в виду»."""
+        snapshot = self._snapshot
+        key = normalize_name(name)
+        candidates = [country for country, _ in snapshot.fuzzy.search(key, limit=limit)]
+        if len(key) >= MIN_PREFIX_LENGTH:
+            candidates.extend(snapshot.fuzzy.prefix(key))
+
+        suggestions: List[str] = []
+        for country in candidates:
+            if country.name not in suggestions:
+                suggestions.append(country.name)
+        return suggestions[:limit]
+
+    def top(self, metric: str, n: int, region: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Первые n стран по метрике (с необязательным фильтром по региону)."""
+        return self._snapshot.table.top(metric, n, region=region)
+
+    def regions(self) -> List[str]:
+        """Регионы текущего набора по алфавиту."""
+        return self._snapshot.regions
+
+    def sampling_pool(self, region: Optional[str] = None) -> Tuple[List[Country], List[int]]:
+        """Страны (всего набора или региона) и накопленные веса по населению для случайного выбора."""
+        return self._snapshot.pool(region)
+
+    @property
+    def table(self) -> "CountryTable":
+        """Колоночная таблица текущего снимка."""
+        return self._snapshot.table
+
+    def all(self) -> List[Country]:
+        """Возвращает текущий список стран."""
+        return self._snapshot.countries
+
+    def __len__(self) -> int:
+        return len(self._snapshot.countries)
+
+
+# Глобальный экземпляр реестра для всего процесса
+country_registry = CountryRegistry()
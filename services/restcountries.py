@@ -1,14 +1,86 @@
 import logging
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import requests  # <-- ВАЖНО: Нужен для API-запросов
+from urllib.parse import quote
+import asyncio
+import hashlib
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.aio import run_blocking
+from services.cache import LookupCache, MISSING
+from services.http_client import ApiClient, AsyncApiClient, CircuitBreaker
+from services.registry import country_registry, normalize_name
+from services.singleflight import AsyncSingleFlight, SingleFlight
+from utils.country import Country
+from utils.snapshot import read_snapshot, snapshot_matches, source_key, write_snapshot
+from utils.storage import atomic_write_bytes, atomic_write_json
 
 logger = logging.getLogger(__name__)
 
 # Файлы данных
 LOCAL_DATA_FILE = "countries_data.json"
 BUILTIN_DATA_FILE = "builtin_countries.json"
+# Двоичный снимок LOCAL_DATA_FILE для быстрой загрузки через mmap (пересоздаётся при изменении JSON)
+SNAPSHOT_FILE = "countries_data.snapshot"
+# Валидаторы (ETag, Last-Modified) последнего ответа /all для условных запросов
+VALIDATORS_FILE = "countries_data.validators.json"
+
+# Общий клиент REST Countries: пул соединений, повторы и автоматический выключатель
+API_BASE_URL = "https://restcountries.com/v3.1"
+# Поля, которые использует бот; /all запрашивается только с ними (API допускает не больше 10)
+REFRESH_FIELDS = (
+    "name", "capital", "region", "subregion", "population",
+    "area", "languages", "currencies", "flags", "altSpellings",
+)
+api_client = ApiClient(
+    API_BASE_URL,
+    timeout=10,
+    retries=2,
+    pool_size=10,
+    breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=30),
+    headers={'User-Agent': 'TelegramBot/1.0', 'Accept': 'application/json'},
+)
+
+# Асинхронный клиент для режима asyncio (тот же выключатель и статистика)
+async_api_client = AsyncApiClient(api_client)
+
+# Фоновая запись набора стран на диск: один поток, задачи выполняются по порядку
+# (JSON, затем зависящие от него снимок и валидаторы), обработчики записи не ждут
+_dataset_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dataset-writer")
+_saved_hash: Optional[str] = None
+_save_lock = threading.Lock()
+
+# Пул для параллельного поиска нескольких стран через API (/compare)
+LOOKUP_WORKERS = 8
+_lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="country-lookup")
+
+# Кэш ответов API по нормализованному запросу: найденные страны и отрицательные результаты
+API_LOOKUP_CACHE_SIZE = 2048
+API_LOOKUP_TTL = 24 * 3600
+API_NOT_FOUND_TTL = 15 * 60
+api_lookup_cache = LookupCache(
+    max_size=API_LOOKUP_CACHE_SIZE,
+    ttl=API_LOOKUP_TTL,
+    negative_ttl=API_NOT_FOUND_TTL,
+)
+# Необязательное постоянное хранилище ответов API (CacheManager или SQLiteCacheManager),
+# общее для перезапусков и процессов; подключается через configure_api_response_store
+api_response_store = None
+
+# Объединение одновременных одинаковых запросов к API (по имени и для полного списка)
+api_flight = SingleFlight()
+async_api_flight = AsyncSingleFlight()
+ALL_COUNTRIES_FLIGHT_KEY = ("all_countries",)
+
+# Фоновое обновление набора стран (stale-while-revalidate)
+COUNTRIES_DATA_TTL = 24 * 3600
+COUNTRIES_REFRESH_INTERVAL = 6 * 3600
+# Минимальная пауза между попытками фонового обновления (когда API недоступен)
+COUNTRIES_REFRESH_RETRY = 5 * 60
 
 
 # --- Функции ввода/вывода данных ---
@@ -47,55 +119,243 @@ def load_local_countries():
     return None
 
 
-def save_local_countries(countries):
-    """Сохраняет страны в локальный файл."""
+def _file_hash(path: str) -> Optional[str]:
     try:
-        with open(LOCAL_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(countries, f, ensure_ascii=False, indent=2)
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def save_local_countries(countries) -> bool:
+    """
+    Сохраняет страны в локальный файл: компактный JSON, временный файл, fsync и rename,
+    так что при сбое на диске остаётся прежняя целая версия.
+    Если содержимое не изменилось, запись пропускается. Возвращает True, если файл записан.
+    """
+    global _saved_hash
+    try:
+        payload = json.dumps(countries, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        with _save_lock:
+            if _saved_hash is None:
+                _saved_hash = _file_hash(LOCAL_DATA_FILE)
+            if digest == _saved_hash:
+                logger.info("Локальный файл стран не изменился, запись пропущена")
+                return False
+            atomic_write_bytes(LOCAL_DATA_FILE, payload)
+            _saved_hash = digest
         logger.info(f"Сохранено {len(countries)} стран в локальный файл")
+        return True
     except Exception as e:
         logger.error(f"Ошибка сохранения локальных данных: {e}")
+        return False
 
 
-# --- ФУНКЦИЯ ДЛЯ РАБОТЫ С API ---
+def _persist_dataset(api_data: List[Dict], countries: List[Country], validators: Dict[str, str]) -> None:
+    """Задача фоновой записи: JSON, затем снимок и валидаторы, привязанные к новому файлу."""
+    written = save_local_countries(api_data)
+    source = source_key(LOCAL_DATA_FILE)
+    if written or not snapshot_matches(SNAPSHOT_FILE, source):
+        save_local_snapshot(countries, source)
+    _save_validators(validators)
+
+
+def flush_dataset_writes(timeout: Optional[float] = None) -> None:
+    """Ждёт завершения уже поставленных в очередь записей набора стран."""
+    _dataset_writer.submit(lambda: None).result(timeout)
+
+
+def load_local_snapshot() -> Optional[List[Country]]:
+    """Страны из двоичного снимка, если он собран из текущей версии LOCAL_DATA_FILE."""
+    source = source_key(LOCAL_DATA_FILE)
+    if source is None:
+        return None
+    countries = read_snapshot(SNAPSHOT_FILE, source)
+    if countries:
+        logger.info(f"Загружено {len(countries)} стран из двоичного снимка")
+    return countries
+
+
+def save_local_snapshot(countries: List[Country], source=None) -> None:
+    """
+    Пересобирает двоичный снимок. source — ключ JSON-файла, из которого получены страны
+    (по умолчанию — текущий); снимок с устаревшим ключом будет собран заново при загрузке.
+    """
+    source = source or source_key(LOCAL_DATA_FILE)
+    if source is None:
+        return
+    try:
+        write_snapshot(SNAPSHOT_FILE, countries, source)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения двоичного снимка стран: {e}")
+
 
-def fetch_all_countries_from_api() -> Optional[List[Dict]]:
-    """Загружает полный список стран для топа через REST Countries API."""
-    url = "https://restcountries.com/v3.1/all"
-    headers = {
-        'User-Agent': 'TelegramBot/1.0',
-        'Accept': 'application/json'
+def _load_dataset() -> Tuple[List, Optional[float]]:
+    """
+    Источник данных для реестра: двоичный снимок локального кэша, сам локальный кэш
+    (снимок при этом пересобирается), затем встроенный резерв.
+    Возрастом локальных данных считается время изменения файла;
+    встроенный резерв сразу считается устаревшим.
+    """
+    countries = load_local_snapshot()
+    if not countries:
+        # Ключ берётся до чтения: если файл изменится во время разбора, снимок не совпадёт с ним
+        source = source_key(LOCAL_DATA_FILE)
+        local_data = load_local_countries()
+        if local_data:
+            countries = [Country.from_dict(c) for c in local_data if isinstance(c, dict)]
+            _dataset_writer.submit(save_local_snapshot, countries, source)
+
+    if countries:
+        try:
+            updated_at = os.path.getmtime(LOCAL_DATA_FILE)
+        except OSError:
+            return countries, None
+        # Ответ 304 подтверждает актуальность файла, не изменяя его
+        return countries, max(updated_at, _load_validators().get("checked_at", 0.0))
+    return get_builtin_countries(), 0.0
+
+
+def _load_validators() -> Dict:
+    """
+    Валидаторы последнего ответа /all. Пустой словарь, если их нет, если запрос был
+    с другим набором полей или если локальный файл с тех пор изменился.
+    """
+    try:
+        with open(VALIDATORS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    source = source_key(LOCAL_DATA_FILE)
+    if (not isinstance(data, dict) or data.get("fields") != list(REFRESH_FIELDS)
+            or source is None or data.get("source") != list(source)):
+        return {}
+    return data
+
+
+def _save_validators(validators: Dict[str, str]) -> None:
+    """Запоминает валидаторы вместе с ключом локального файла, к которому они относятся."""
+    source = source_key(LOCAL_DATA_FILE)
+    if source is None:
+        return
+    try:
+        atomic_write_json(VALIDATORS_FILE, {
+            **validators,
+            "fields": list(REFRESH_FIELDS),
+            "source": list(source),
+            "checked_at": time.time(),
+        })
+    except Exception as e:
+        logger.error(f"Ошибка сохранения валидаторов списка стран: {e}")
+
+
+def get_api_stats() -> Dict:
+    """Статистика обращений к REST Countries и кэша ответов API для мониторинга."""
+    return {
+        "http": api_client.stats(),
+        "lookup_cache": api_lookup_cache.stats(),
+        "response_store": api_response_store.stats() if api_response_store is not None else None,
     }
 
+
+def get_country_registry():
+    """Возвращает реестр стран, загружая набор данных при первом обращении."""
+    country_registry.ensure_loaded(_load_dataset)
+    return country_registry
+
+
+def _build_rankings_table(countries: List[Country]) -> None:
+    """Строит таблицу рейтингов нового снимка в потоке загрузки, чтобы её не строил запрос /top."""
+    country_registry.table
+
+
+# Таблица строится после каждой загрузки: при старте, обновлении из API и перечитывании снимка
+country_registry.on_load(_build_rankings_table)
+
+
+def warm_up() -> None:
+    """Загружает набор стран и строит индексы и таблицу рейтингов заранее, до первого запроса."""
+    started = time.monotonic()
+    try:
+        registry = get_country_registry()
+        logger.info(f"Данные стран подготовлены за {time.monotonic() - started:.2f} с: {len(registry)} стран")
+    except Exception as e:
+        logger.error(f"Ошибка предварительной загрузки данных стран: {e}", exc_info=True)
+
+
+def start_warm_up() -> threading.Thread:
+    """
+    Запускает warm_up в фоновом потоке, чтобы подготовка данных шла параллельно
+    с подключением к Telegram. Обработчики, пришедшие раньше, дождутся загрузки реестра.
+    """
+    thread = threading.Thread(target=warm_up, name="countries-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- ФУНКЦИЯ ДЛЯ РАБОТЫ С API ---
+
+def fetch_all_countries_from_api(validators: Optional[Dict] = None) -> Tuple[int, Optional[List[Dict]], Dict[str, str]]:
+    """
+    Загружает список стран через REST Countries API (только поля REFRESH_FIELDS).
+    validators — ETag/Last-Modified прошлого ответа: с ними запрос условный,
+    и неизменившийся набор приходит ответом 304 без тела.
+    Возвращает (статус, страны или None, валидаторы нового ответа); статус 0 — сеть недоступна.
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
     try:
         logger.info("Попытка загрузить полный список стран через API...")
-        response = requests.get(url, headers=headers, timeout=20)
+        response = api_client.get(
+            "/all",
+            params={"fields": ",".join(REFRESH_FIELDS)},
+            headers=headers or None,
+            timeout=20,
+            deadline=45,
+        )
+        new_validators = {
+            key: value for key, value in (
+                ("etag", response.headers.get("ETag")),
+                ("last_modified", response.headers.get("Last-Modified")),
+            ) if value
+        }
+
+        if response.status_code == 304:
+            logger.info("Список стран не изменился (304 Not Modified)")
+            return 304, None, new_validators or dict(validators or {})
 
         if response.status_code == 200:
             data = response.json()
             if isinstance(data, list) and len(data) > 0:
                 logger.info(f"Успешно загружено {len(data)} стран через API.")
-                return data
+                return 200, data, new_validators
             else:
                 logger.warning("API вернул пустой или некорректный список стран.")
-                return None
+                return 200, None, {}
         else:
             logger.error(f"Ошибка API при загрузке всех стран. Статус: {response.status_code}")
-            return None
+            return response.status_code, None, {}
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         logger.error(f"Ошибка сети при загрузке всех стран (API недоступен): {e}")
-        return None
+        return 0, None, {}
 
 
 # --- ГЛАВНАЯ ФУНКЦИЯ ПОИСКА СТРАНЫ ---
 
-def fetch_country_by_name(name: str) -> Optional[Dict]:
+def fetch_country_by_name(name: str) -> Optional[Country]:
     """
     Получить информацию о стране по имени:
-    1. Поиск в локальном кэше.
-    2. Поиск во встроенном резерве.
-    3. Поиск через API (только если не найдено локально).
+    1. Поиск в реестре стран (локальный кэш или встроенный резерв, загружается один раз),
+       включая нечёткий поиск по опечаткам.
+    2. Кэш ответов API (найденные страны и отрицательные результаты с TTL).
+    3. Поиск через API (только если локально нет даже похожих вариантов).
     """
     try:
         if not name or not name.strip():
@@ -103,79 +363,445 @@ def fetch_country_by_name(name: str) -> Optional[Dict]:
             return None
 
         name = name.strip()
+        resolved, country = _resolve_locally(name)
+        if resolved:
+            return country
+
+        # 3. Если не найдено локально, обращаемся к API.
+        return _fetch_country_shared(name)
 
-        # 1. Поиск в локальных данных (кэш и резерв)
-        all_countries = load_local_countries()
-        if not all_countries:
-            all_countries = get_builtin_countries()
+    except Exception as e:
+        logger.error(f"Критическая ошибка в fetch_country_by_name для '{name}': {e}", exc_info=True)
+        return None
 
-        # Ищем в локальных/встроенных данных
-        if all_countries:
-            for country in all_countries:
-                country_name = country.get("name", {}).get("common", "").lower()
-                if country_name == name.lower():
-                    logger.info(f"Страна '{name}' найдена в локальных данных")
-                    return country
 
-        # 2. Если не найдено локально, обращаемся к API (НОВОЕ ИЗМЕНЕНИЕ)
-        logger.info(f"Страна '{name}' не найдена локально. Поиск через API...")
-        url = f"https://restcountries.com/v3.1/name/{name}?fullText=true"
-        headers = {'User-Agent': 'TelegramBot/1.0', 'Accept': 'application/json'}
+def _fetch_country_shared(name: str) -> Optional[Country]:
+    """Шаг 3: поиск через API. Одновременные запросы одного и того же имени разделяют один HTTP-вызов."""
+    cache_key = normalize_name(name)
+    country, shared = api_flight.do(("name", cache_key), lambda: _fetch_country_from_api(name, cache_key))
+    if shared:
+        logger.info(f"Страна '{name}': результат получен из параллельного запроса к API")
+    return country
 
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if isinstance(data, list) and len(data) > 0:
-                    logger.info(f"Страна '{name}' найдена через API.")
-                    # Возвращаем первый результат
-                    return data[0]
 
-            # Если статус 404 (Not Found) или другой
-            logger.warning(f"API не нашел страну '{name}'. Статус: {response.status_code}")
+def _resolve_locally(name: str) -> Tuple[bool, Optional[Country]]:
+    """
+    Шаги 1–2 поиска без сети. Возвращает (resolved, country):
+    resolved=True — ответ известен (country может быть None), обращаться к API не нужно.
+    """
+    resolved, country = _resolve_in_memory(name)
+    if resolved:
+        return resolved, country
+    return _resolve_from_store(name)
+
+
+def _resolve_in_memory(name: str) -> Tuple[bool, Optional[Country]]:
+    """Реестр и кэш ответов API в памяти: без диска и сети, можно вызывать в цикле событий."""
+    # 1. Поиск в реестре (индексы по названиям, кодам и альтернативным написаниям,
+    #    при промахе — нечёткий поиск и поиск по префиксу)
+    registry = get_country_registry()
+    country = registry.search(name)
+    if country:
+        logger.info(f"Страна '{name}' найдена в локальных данных")
+        return True, country
+
+    # 2. Ранее полученный ответ API (в том числе «не найдено»)
+    cached = api_lookup_cache.get(normalize_name(name))
+    if cached is not MISSING:
+        logger.info(f"Страна '{name}' взята из кэша ответов API (найдена: {cached is not None})")
+        return True, cached
+    return False, None
+
+
+def _resolve_from_store(name: str) -> Tuple[bool, Optional[Country]]:
+    """Ответ API из постоянного хранилища (может читать диск: в асинхронном режиме — через run_blocking)."""
+    if api_response_store is None:
+        return False, None
+    cache_key = normalize_name(name)
+    stored = api_response_store.get(cache_key)
+    if not isinstance(stored, dict):
+        return False, None
+    data = stored.get("country")
+    cached = Country.from_dict(data) if isinstance(data, dict) else None
+    api_lookup_cache.set(cache_key, cached)
+    logger.info(f"Страна '{name}' взята из хранилища ответов API (найдена: {cached is not None})")
+    return True, cached
+
+
+def _remember_api_answer(cache_key: str, data: Optional[Dict]) -> Optional[Country]:
+    """
+    Запоминает ответ API: в памяти — компактной записью Country,
+    в постоянном хранилище (если подключено) — исходным JSON.
+    """
+    country = Country.from_dict(data) if data is not None else None
+    api_lookup_cache.set(cache_key, country)
+    if api_response_store is not None:
+        ttl = API_LOOKUP_TTL if data is not None else API_NOT_FOUND_TTL
+        api_response_store.set(cache_key, {"country": data}, ttl=ttl)
+    return country
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка сети при поиске '{name}' через API: {e}")
 
-        logger.warning(f"Страна '{name}' не найдена ни в одном источнике.")
-        return None
+def configure_api_response_store(store) -> None:
+    """Подключает постоянное хранилище ответов API (см. services.cache.create_cache_manager)."""
+    global api_response_store
+    api_response_store = store
+
+
+def close_api_response_store() -> None:
+    """Сбрасывает на диск отложенные записи хранилища ответов API и закрывает его."""
+    if api_response_store is not None:
+        api_response_store.close()
+
+
+def _store_api_answer(name: str, cache_key: str, status: int, data) -> Optional[Country]:
+    """Разбирает ответ API на поиск по имени и сохраняет его в кэше ответов API."""
+    if status == 200 and isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
+        logger.info(f"Страна '{name}' найдена через API.")
+        # Возвращаем первый результат
+        return _remember_api_answer(cache_key, data[0])
+
+    # Запоминаем только окончательные промахи; ошибки сервера могут быть временными
+    if status in (200, 400, 404):
+        _remember_api_answer(cache_key, None)
+
+    # Если статус 404 (Not Found) или другой
+    logger.warning(f"API не нашел страну '{name}'. Статус: {status}")
+    return None
+
+
+def _fetch_country_from_api(name: str, cache_key: str) -> Optional[Country]:
+    """Ищет страну через API и сохраняет ответ в кэше ответов API."""
+    # Пока ждали своей очереди, ответ мог появиться в кэше
+    cached = api_lookup_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    logger.info(f"Страна '{name}' не найдена локально. Поиск через API...")
+    try:
+        response = api_client.get(
+            f"/name/{quote(name, safe='')}",
+            params={'fullText': 'true'},
+            timeout=5,
+            deadline=10,
+        )
+        data = response.json() if response.status_code == 200 else None
+        country = _store_api_answer(name, cache_key, response.status_code, data)
+        if country:
+            return country
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка сети при поиске '{name}' через API: {e}")
+
+    logger.warning(f"Страна '{name}' не найдена ни в одном источнике.")
+    return None
+
+
+def fetch_countries_by_names(names: List[str]) -> List[Optional[Country]]:
+    """
+    Пакетный поиск: результат в том же порядке, что и names.
+    Локально найденные страны возвращаются сразу, остальные ищутся
+    через API параллельно, так что задержка — примерно одного запроса, а не суммы.
+    """
+    results: List[Optional[Country]] = [None] * len(names)
+    pending: Dict[str, List[int]] = {}
+
+    for i, name in enumerate(names):
+        if not name or not name.strip():
+            continue
+        resolved, country = _resolve_locally(name.strip())
+        if resolved:
+            results[i] = country
+        else:
+            # Одинаковые запросы внутри пакета ищутся один раз
+            pending.setdefault(normalize_name(name), []).append(i)
+
+    if pending:
+        # Локальные источники уже проверены: промахи сразу идут в API
+        futures = {
+            key: _lookup_executor.submit(_fetch_country_shared, names[positions[0]].strip())
+            for key, positions in pending.items()
+        }
+        for key, future in futures.items():
+            try:
+                country = future.result()
+            except Exception as e:
+                logger.error(f"Ошибка пакетного поиска '{names[pending[key][0]]}': {e}", exc_info=True)
+                country = None
+            for i in pending[key]:
+                results[i] = country
+
+    return results
+
+
+def suggest_countries(name: str, limit: int = 3) -> List[str]:
+    """Похожие названия стран для подсказки «возможно, вы имели в виду»."""
+    if not name or not name.strip():
+        return []
+    return get_country_registry().suggest(name.strip(), limit=limit)
+
+
+# --- ФОНОВОЕ ОБНОВЛЕНИЕ НАБОРА СТРАН ---
+
+_last_refresh_attempt = 0.0
+_refresher: Optional["CountriesRefresher"] = None
+_shared_watcher: Optional["SharedDatasetWatcher"] = None
+
+
+def _diff_countries(current: List[Country], new_data: List[Dict]) -> Tuple[List[Country], int, int, int]:
+    """
+    Сопоставляет новый набор с текущим по названию. Неизменившиеся страны остаются
+    прежними записями (вместе с построенными для них индексами и кэшами),
+    для изменившихся и новых создаются новые записи.
+    Возвращает (записи в порядке new_data, изменено, добавлено, удалено).
+    """
+    by_name = {country.name: country for country in current}
+    countries: List[Country] = []
+    changed = added = 0
+    for data in new_data:
+        name = data.get("name")
+        old = by_name.pop(name.get("common") if isinstance(name, dict) else name, None)
+        if old is not None and old.raw == data:
+            countries.append(old)
+            continue
+        countries.append(Country.from_dict(data))
+        if old is None:
+            added += 1
+        else:
+            changed += 1
+    return countries, changed, added, len(by_name)
+
+
+def refresh_countries() -> bool:
+    """
+    Загружает набор стран из API и атомарно подменяет его в реестре.
+    Файл перезаписывается только при изменении содержимого.
+    Возвращает True, если данные изменились. Одновременные вызовы
+    разделяют одну загрузку и получают её результат.
+    """
+    changed, shared = api_flight.do(ALL_COUNTRIES_FLIGHT_KEY, _refresh_countries_once)
+    if shared:
+        logger.info("Обновление списка стран выполнено параллельным вызовом")
+    return changed
+
+
+def _refresh_countries_once() -> bool:
+    global _last_refresh_attempt
+
+    _last_refresh_attempt = time.monotonic()
+    registry = get_country_registry()
+    # Условный запрос имеет смысл, только если в памяти данные из локального файла
+    validators = _load_validators() if registry.all() else {}
+
+    status, api_data, new_validators = fetch_all_countries_from_api(validators)
+    if status == 304:
+        registry.touch()
+        _dataset_writer.submit(_save_validators, new_validators)
+        return False
+    if not api_data:
+        return False
+
+    api_data = [c for c in api_data if isinstance(c, dict)]
+    current = registry.all()
+    countries, changed, added, removed = _diff_countries(current, api_data)
+    if not (changed or added or removed) and all(a is b for a, b in zip(countries, current)):
+        logger.info("Список стран не изменился, запись на диск не требуется")
+        registry.touch()
+        _dataset_writer.submit(_save_validators, new_validators)
+        return False
+
+    # Реестр обновляется сразу, запись на диск идёт в фоне
+    registry.load(countries)
+    _dataset_writer.submit(_persist_dataset, api_data, countries, new_validators)
+    logger.info(
+        f"Список стран обновлён из API: {len(countries)} стран "
+        f"(изменено {changed}, добавлено {added}, удалено {removed})"
+    )
+    return True
+
+
+def schedule_refresh() -> None:
+    """Запускает обновление в фоновом потоке, не блокируя вызывающего."""
+    if _shared_watcher is not None:
+        # Набор обновляет другой процесс, этот только перечитывает снимок
+        return
+    if api_flight.in_flight(ALL_COUNTRIES_FLIGHT_KEY):
+        return
+    if time.monotonic() - _last_refresh_attempt < COUNTRIES_REFRESH_RETRY:
+        return
+    threading.Thread(target=refresh_countries, name="countries-refresh", daemon=True).start()
+
+
+class CountriesRefresher(threading.Thread):
+    """Периодически обновляет набор стран, если он старше TTL."""
+    def __init__(self, interval: float = COUNTRIES_REFRESH_INTERVAL, ttl: float = COUNTRIES_DATA_TTL):
+        super().__init__(name="countries-refresher", daemon=True)
+        self.interval = interval
+        self.ttl = ttl
+        self._stop_event = threading.Event()
+
+    def run(self):
+        # Первая проверка — сразу при старте, чтобы устаревший файл обновился быстро
+        while not self._stop_event.is_set():
+            age = get_country_registry().age
+            if age is None or age >= self.ttl:
+                try:
+                    refresh_countries()
+                except Exception as e:
+                    logger.error(f"Ошибка фонового обновления списка стран: {e}", exc_info=True)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_background_refresh(interval: float = COUNTRIES_REFRESH_INTERVAL,
+                             ttl: float = COUNTRIES_DATA_TTL) -> "CountriesRefresher":
+    """Запускает фоновое обновление набора стран (один раз на процесс)."""
+    global _refresher, COUNTRIES_DATA_TTL
+
+    COUNTRIES_DATA_TTL = ttl
+    if _refresher is None or not _refresher.is_alive():
+        _refresher = CountriesRefresher(interval=interval, ttl=ttl)
+        _refresher.start()
+        logger.info(f"Фоновое обновление стран: интервал {interval} с, TTL {ttl} с")
+    return _refresher
+
+
+class SharedDatasetWatcher(threading.Thread):
+    """
+    Перечитывает набор стран, когда его обновил другой процесс.
+    Новая версия загружается из двоичного снимка (через mmap, страницы общие
+    для всех процессов), как только снимок для нового JSON-файла готов.
+    """
+    def __init__(self, interval: float):
+        super().__init__(name="countries-watcher", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        registry = get_country_registry()
+        current = source_key(LOCAL_DATA_FILE)
+        while not self._stop_event.wait(self.interval):
+            source = source_key(LOCAL_DATA_FILE)
+            if source == current or not snapshot_matches(SNAPSHOT_FILE, source):
+                continue
+            try:
+                countries, updated_at = _load_dataset()
+                registry.load(countries, updated_at=updated_at)
+                current = source
+                logger.info(f"Набор стран перечитан после обновления другим процессом: {len(countries)} стран")
+            except Exception as e:
+                logger.error(f"Ошибка перечитывания набора стран: {e}", exc_info=True)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def follow_shared_dataset(interval: float = 30.0) -> "SharedDatasetWatcher":
+    """
+    Режим процесса-читателя: набор стран не обновляется из API, а перечитывается
+    с диска после обновления процессом, в котором работает start_background_refresh.
+    """
+    global _shared_watcher
+
+    if _shared_watcher is None or not _shared_watcher.is_alive():
+        _shared_watcher = SharedDatasetWatcher(interval)
+        _shared_watcher.start()
+    return _shared_watcher
+
+
+# --- ФУНКЦИЯ ДЛЯ ТОПА ---
+
+def fetch_all_countries() -> Optional[List[Country]]:
+    """
+    Получить список всех стран для топа.
+    Всегда отвечает из памяти (реестр: локальный кэш или встроенный резерв);
+    если данные старше TTL, обновление из API запускается в фоне.
+    Сеть ожидается только при холодном старте без каких-либо локальных данных.
+    """
+    logger.info("Получение списка стран для топа...")
+
+    registry = get_country_registry()
+    age = registry.age
+    if age is None or age >= COUNTRIES_DATA_TTL:
+        schedule_refresh()
+
+    data = registry.all()
+    if data:
+        return data
+
+    logger.warning("Локальные данные отсутствуют. Загружаем список стран из API...")
+    refresh_countries()
+    return registry.all()
+
+
+# --- АСИНХРОННЫЙ ИНТЕРФЕЙС (режим asyncio) ---
+
+async def afetch_country_by_name(name: str) -> Optional[Country]:
+    """Асинхронный аналог fetch_country_by_name: локальный поиск без ожиданий, API — без блокировки потока."""
+    try:
+        if not name or not name.strip():
+            logger.warning("Пустое название страны")
+            return None
+
+        name = name.strip()
+        resolved, country = _resolve_in_memory(name)
+        if not resolved and api_response_store is not None:
+            # Хранилище может быть базой SQLite: цикл событий не ждёт диска
+            resolved, country = await run_blocking(_resolve_from_store, name)
+        if resolved:
+            return country
+
+        cache_key = normalize_name(name)
+        country, shared = await async_api_flight.do(
+            ("name", cache_key), lambda: _afetch_country_from_api(name, cache_key)
+        )
+        if shared:
+            logger.info(f"Страна '{name}': результат получен из параллельного запроса к API")
+        return country
 
     except Exception as e:
-        logger.error(f"Критическая ошибка в fetch_country_by_name для '{name}': {e}", exc_info=True)
+        logger.error(f"Критическая ошибка в afetch_country_by_name для '{name}': {e}", exc_info=True)
         return None
 
 
-# --- ФУНКЦИЯ ДЛЯ ТОПА (ОСТАЛАСЬ БЕЗ ИЗМЕНЕНИЙ) ---
+async def afetch_countries_by_names(names: List[str]) -> List[Optional[Country]]:
+    """Асинхронный пакетный поиск: все страны ищутся одновременно, порядок сохраняется."""
+    return list(await asyncio.gather(*(afetch_country_by_name(name) for name in names)))
+
+
+async def _afetch_country_from_api(name: str, cache_key: str) -> Optional[Country]:
+    cached = api_lookup_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
 
-def fetch_all_countries() -> Optional[List[Dict]]:
+    logger.info(f"Страна '{name}' не найдена локально. Асинхронный поиск через API...")
+    try:
+        status, data = await async_api_client.get_json(
+            f"/name/{quote(name, safe='')}",
+            params={'fullText': 'true'},
+            timeout=5,
+            deadline=10,
+        )
+        # Ответ записывается и в постоянное хранилище — вне цикла событий
+        country = await run_blocking(_store_api_answer, name, cache_key, status, data)
+        if country:
+            return country
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка сети при поиске '{name}' через API: {e}")
+
+    logger.warning(f"Страна '{name}' не найдена ни в одном источнике.")
+    return None
+
+
+async def afetch_all_countries() -> Optional[List[Country]]:
     """
-    Получить список всех стран для топа:
-    1. API -> сохраняется в кэш.
-    2. Локальный кэш.
-    3. Встроенный список.
+    Асинхронный аналог fetch_all_countries. Обычно ответ сразу берётся из памяти;
+    первая загрузка с диска или из API выполняется в пуле потоков цикла.
     """
-    logger.info("Получение списка стран для топа...")
+    if country_registry.loaded and len(country_registry):
+        return fetch_all_countries()
 
-    # 1. Сначала пробуем получить данные из API
-    api_data = fetch_all_countries_from_api()
-    if api_data:
-        save_local_countries(api_data)
-        logger.info("Используем полный список, полученный из API.")
-        return api_data
-
-    # 2. Если API недоступен, пробуем загрузить из локального файла (кэша)
-    logger.warning("API недоступен. Пробуем использовать локальный кэш...")
-    local_data = load_local_countries()
-    if local_data:
-        logger.info(f"Используем локальный кэш: {len(local_data)} стран")
-        return local_data
-
-    # 3. Если нет ни API, ни кэша, используем встроенный резерв
-    logger.error("Локальный кэш также недоступен. Используем встроенный резервный список.")
-    builtin_countries = get_builtin_countries()
-
-    if builtin_countries:
-        save_local_countries(builtin_countries)
-
-    logger.info(f"Используем встроенный резерв: {len(builtin_countries)} стран")
-    return builtin_countries
\ No newline at end of file
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, fetch_all_countries)
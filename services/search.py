@@ -0,0 +1,148 @@
+import bisect
+import copy
+import logging
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.country import Country
+
+logger = logging.getLogger(__name__)
+
+# Порог, начиная с которого лучший кандидат считается однозначным совпадением
+MATCH_THRESHOLD = 0.8
+# Порог, начиная с которого кандидат показывается в списке «возможно, вы имели в виду»
+SUGGEST_THRESHOLD = 0.5
+# Минимальная длина запроса для поиска по префиксу
+MIN_PREFIX_LENGTH = 3
+# Префикс принимается как совпадение, только если покрывает такую долю ключа:
+# "Austral" — Australia, но "Niger" — не Nigeria
+MIN_PREFIX_COVERAGE = 0.75
+# Опечатка почти не меняет длину: "Germny" — Germany, но "Austria" — не Australia
+MAX_TYPO_LENGTH_DIFFERENCE = 1
+# Сколько кандидатов из триграммного фильтра проверяется точной метрикой
+_RERANK_LIMIT = 20
+
+
+def _trigrams(key: str) -> List[str]:
+    """Триграммы ключа с границами слова: 'абв' -> ['  а', ' аб', 'абв', 'бв ']."""
+    padded = f"  {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class FuzzyIndex:
+    """
+    Нечёткий поиск по названиям стран.
+    Строится один раз над всеми ключами реестра: триграммный инвертированный
+    индекс отбирает кандидатов, а SequenceMatcher ранжирует их окончательно.
+    Отдельно поддерживается поиск по префиксу через отсортированный список ключей.
+    """
+    def __init__(self, entries: Iterable[Tuple[str, Country]]):
+        self._keys: List[str] = []
+        self._countries: List[Country] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+        for key, country in entries:
+            if not key:
+                continue
+            key_id = len(self._keys)
+            self._keys.append(key)
+            self._countries.append(country)
+            for gram in set(_trigrams(key)):
+                self._postings[gram].append(key_id)
+
+        self._sorted = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+        self._sorted_keys = [self._keys[i] for i in self._sorted]
+
+    def with_countries(self, replacements: Dict[int, Country]) -> "FuzzyIndex":
+        """
+        Копия индекса с теми же ключами, в которой записи заменены по словарю
+        id(старая запись) -> новая запись. Триграммы и сортировка не пересчитываются.
+        """
+        index = copy.copy(self)
+        index._countries = [replacements.get(id(c), c) for c in self._countries]
+        return index
+
+    def prefix(self, prefix: str) -> List[Country]:
+        """Страны, у которых хотя бы один ключ начинается с prefix (без повторов)."""
+        if not prefix:
+            return []
+        result: List[Country] = []
+        seen = set()
+        pos = bisect.bisect_left(self._sorted_keys, prefix)
+        while pos < len(self._sorted_keys) and self._sorted_keys[pos].startswith(prefix):
+            country = self._countries[self._sorted[pos]]
+            if id(country) not in seen:
+                seen.add(id(country))
+                result.append(country)
+            pos += 1
+        return result
+
+    def search(self, query: str, limit: int = 5,
+               threshold: float = SUGGEST_THRESHOLD) -> List[Tuple[Country, float]]:
+        """
+        Возвращает до limit стран с оценкой сходства от 0 до 1, по убыванию.
+        query должен быть уже нормализован.
+        """
+        best = self._scored(query, threshold)
+        return sorted(
+            ((self._countries[key_id], score) for key_id, score in best.values()),
+            key=lambda item: item[1], reverse=True
+        )[:limit]
+
+    def _scored(self, query: str, threshold: float) -> Dict[int, Tuple[int, float]]:
+        """Лучший ключ каждой страны с оценкой не ниже threshold: id(страны) -> (номер ключа, оценка)."""
+        if not query or not self._keys:
+            return {}
+
+        query_grams = set(_trigrams(query))
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for key_id in self._postings.get(gram, ()):
+                overlap[key_id] += 1
+        if not overlap:
+            return {}
+
+        candidates = sorted(overlap, key=overlap.__getitem__, reverse=True)[:_RERANK_LIMIT]
+
+        best: Dict[int, Tuple[int, float]] = {}
+        for key_id in candidates:
+            score = SequenceMatcher(None, query, self._keys[key_id]).ratio()
+            if score < threshold:
+                continue
+            country_id = id(self._countries[key_id])
+            previous = best.get(country_id)
+            if previous is None or previous[1] < score:
+                best[country_id] = (key_id, score)
+        return best
+
+    def best_match(self, query: str) -> Optional[Country]:
+        """
+        Однозначное совпадение: единственная страна по префиксу, покрывающему
+        большую часть ключа, или похожий по длине кандидат с оценкой не ниже
+        MATCH_THRESHOLD, заметно опережающий второго. Иначе None — пусть ищет API.
+        """
+        if len(query) >= MIN_PREFIX_LENGTH:
+            by_prefix = self.prefix(query)
+            if len(by_prefix) == 1 and self._prefix_coverage(query) >= MIN_PREFIX_COVERAGE:
+                return by_prefix[0]
+
+        matches = sorted(self._scored(query, MATCH_THRESHOLD).values(), key=lambda item: item[1], reverse=True)
+        if not matches:
+            return None
+        if len(matches) > 1 and matches[0][1] - matches[1][1] < 0.05:
+            return None
+        key_id, _ = matches[0]
+        if abs(len(self._keys[key_id]) - len(query)) > MAX_TYPO_LENGTH_DIFFERENCE:
+            return None
+        return self._countries[key_id]
+
+    def _prefix_coverage(self, prefix: str) -> float:
+        """Доля самого короткого ключа, начинающегося с prefix, которую prefix покрывает."""
+        pos = bisect.bisect_left(self._sorted_keys, prefix)
+        shortest = None
+        while pos < len(self._sorted_keys) and self._sorted_keys[pos].startswith(prefix):
+            length = len(self._sorted_keys[pos])
+            shortest = length if shortest is None else min(shortest, length)
+            pos += 1
+        return len(prefix) / shortest if shortest else 0.0
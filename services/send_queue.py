@@ -0,0 +1,310 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Optional
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений: меньше — раньше
+PRIORITY_REPLY = 0
+PRIORITY_LOW = 10
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота, 1 в секунду в личный чат,
+# 20 в минуту в группу
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+GROUP_RATE = 20 / 60
+CHAT_BURST = 3
+
+# Максимальная длина текста сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+_BATCH_SEPARATOR = "\n\n"
+
+
+def _same_options(a: Dict, b: Dict) -> bool:
+    return a.keys() == b.keys() and all(a[k] is b[k] or a[k] == b[k] for k in a)
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "fn", "args", "kwargs", "message", "text",
+                 "futures", "error_callbacks", "attempts")
+
+    def __init__(self, priority: int, seq: int, chat_id: int, fn: Optional[Callable] = None,
+                 args=(), kwargs=None, message=None, text: Optional[str] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        # Для ответов (message.reply_text) — исходное сообщение и текст: такие задачи можно склеивать
+        self.message = message
+        self.text = text
+        self.futures: List[Future] = [Future()]
+        self.error_callbacks: List[Callable[[Exception], None]] = [on_error] if on_error else []
+        self.attempts = 0
+
+    def can_merge(self, other: "_Job") -> bool:
+        # Только в личных чатах: в группе ответ цитирует исходное сообщение,
+        # и склеенные ответы разным участникам ушли бы ответом первому из них
+        return (
+            self.text is not None and other.text is not None
+            and self.chat_id > 0
+            and self.priority == other.priority
+            and _same_options(self.kwargs, other.kwargs)
+            and len(self.text) + len(_BATCH_SEPARATOR) + len(other.text) <= MAX_MESSAGE_LENGTH
+        )
+
+    def merge(self, other: "_Job") -> None:
+        self.text = self.text + _BATCH_SEPARATOR + other.text
+        self.futures.extend(other.futures)
+        self.error_callbacks.extend(other.error_callbacks)
+
+    def run(self):
+        if self.text is not None:
+            return self.message.reply_text(self.text, **self.kwargs)
+        return self.fn(*self.args, **self.kwargs)
+
+
+class SendQueue:
+    """
+    Общая очередь исходящих сообщений.
+    Обработчики только ставят ответ в очередь и сразу освобождают поток; отправкой занимаются
+    workers потоков. Темп ограничен ведром токенов на весь бот и отдельным ведром на каждый чат
+    (в группах — медленнее). Сообщения одного чата уходят строго по порядку; ответы
+    одного чата с одинаковыми параметрами, накопившиеся в очереди, склеиваются в одно
+    сообщение (только в личных чатах). Между чатами очередь обслуживается по приоритету,
+    затем по времени постановки. На RetryAfter чат приостанавливается на указанное Telegram
+    время, сетевые ошибки повторяются ограниченное число раз. Об окончательной ошибке
+    отправки сообщают Future задачи и необязательный обратный вызов on_error.
+    """
+    def __init__(self, workers: int = 4, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE,
+                 group_rate: float = GROUP_RATE, chat_burst: int = CHAT_BURST,
+                 max_retries: int = 3, max_chats: int = 10000):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+
+        self._global = TokenBucket(global_rate, max(1, int(global_rate)))
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._chats: Dict[int, Deque[_Job]] = {}
+        self._blocked_until: Dict[int, float] = {}
+        self._ready: List = []     # (приоритет, seq, chat_id) — чаты, которые можно обслужить сейчас
+        self._waiting: List = []   # (время, seq, chat_id) — чаты, ждущие своего темпа или RetryAfter
+        self._scheduled = set()
+        self._in_flight = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._counters = {"queued": 0, "sent": 0, "merged": 0, "retry_after": 0, "retries": 0, "failed": 0}
+
+    # --- постановка в очередь ---
+
+    def reply(self, message, text: str, priority: int = PRIORITY_REPLY,
+              on_error: Optional[Callable[[Exception], None]] = None, **kwargs) -> Future:
+        """
+        Ставит в очередь message.reply_text(text, **kwargs). Future получит отправленное сообщение;
+        on_error вызывается в потоке отправки, если сообщение так и не удалось отправить.
+        """
+        return self._put(_Job(priority, next(self._seq), message.chat_id,
+                              kwargs=kwargs, message=message, text=text, on_error=on_error))
+
+    def submit(self, chat_id: int, fn: Callable, *args, priority: int = PRIORITY_REPLY, **kwargs) -> Future:
+        """Ставит в очередь произвольный вызов Bot API, относящийся к чату chat_id."""
+        return self._put(_Job(priority, next(self._seq), chat_id, fn=fn, args=args, kwargs=kwargs))
+
+    def _put(self, job: _Job) -> Future:
+        if not self._threads:
+            self.start()
+        with self._cond:
+            queue = self._chats.setdefault(job.chat_id, deque())
+            # Внутри чата — по приоритету, при равном приоритете — по порядку постановки
+            position = len(queue)
+            while position > 0 and queue[position - 1].priority > job.priority:
+                position -= 1
+            queue.insert(position, job)
+            self._counters["queued"] += 1
+            self._schedule(job.chat_id, time.monotonic())
+            self._cond.notify()
+        return job.futures[0]
+
+    # --- планирование (под self._cond) ---
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _schedule(self, chat_id: int, now: float) -> None:
+        if chat_id in self._scheduled or chat_id in self._in_flight or not self._chats.get(chat_id):
+            return
+        self._scheduled.add(chat_id)
+        ready_at = max(self._blocked_until.get(chat_id, 0.0), now + self._chat_bucket(chat_id).delay(now))
+        if ready_at > now:
+            heapq.heappush(self._waiting, (ready_at, next(self._seq), chat_id))
+        else:
+            head = self._chats[chat_id][0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+
+    def _next_job(self) -> Optional[_Job]:
+        """Следующая задача для отправки; ждёт, пока она появится. None — очередь остановлена."""
+        while True:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._waiting)
+                self._scheduled.discard(chat_id)
+                self._schedule(chat_id, now)
+
+            if not self._ready:
+                if self._stopping and not self._waiting and not self._in_flight:
+                    return None
+                self._cond.wait(self._waiting[0][0] - now if self._waiting else None)
+                continue
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            self._scheduled.discard(chat_id)
+            queue = self._chats.get(chat_id)
+            if not queue:
+                continue
+
+            self._global.consume(now)
+            self._chat_bucket(chat_id).consume(now)
+            job = queue.popleft()
+            while queue and job.can_merge(queue[0]):
+                job.merge(queue.popleft())
+                self._counters["merged"] += 1
+            if not queue:
+                del self._chats[chat_id]
+            self._in_flight.add(chat_id)
+            return job
+
+    def _finish(self, job: _Job, counter: str, requeue: bool = False, blocked_for: float = 0.0) -> None:
+        with self._cond:
+            self._counters[counter] += 1
+            now = time.monotonic()
+            self._in_flight.discard(job.chat_id)
+            if requeue:
+                self._chats.setdefault(job.chat_id, deque()).appendleft(job)
+            if blocked_for:
+                self._blocked_until[job.chat_id] = now + blocked_for
+            elif self._blocked_until.get(job.chat_id, 0.0) <= now:
+                self._blocked_until.pop(job.chat_id, None)
+            self._schedule(job.chat_id, now)
+            self._cond.notify_all()
+
+    # --- отправка ---
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+            if job is None:
+                return
+            self._send(job)
+
+    def _send(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = job.run()
+        except RetryAfter as e:
+            logger.warning(f"Telegram просит подождать {e.retry_after} с перед отправкой в чат {job.chat_id}")
+            self._finish(job, "retry_after", requeue=True, blocked_for=float(e.retry_after))
+            return
+        except BadRequest as e:
+            # Наследник NetworkError, но повтор того же запроса ничего не изменит
+            self._fail(job, e)
+            return
+        except (TimedOut, NetworkError) as e:
+            if job.attempts <= self.max_retries:
+                logger.info(f"Повтор отправки в чат {job.chat_id} (попытка {job.attempts + 1}): {e}")
+                self._finish(job, "retries", requeue=True, blocked_for=min(2.0 ** job.attempts, 30.0))
+                return
+            self._fail(job, e)
+            return
+        except Exception as e:
+            self._fail(job, e)
+            return
+
+        self._finish(job, "sent")
+        for future in job.futures:
+            future.set_result(result)
+
+    def _fail(self, job: _Job, error: Exception) -> None:
+        logger.error(f"Не удалось отправить сообщение в чат {job.chat_id}: {error}")
+        self._finish(job, "failed")
+        for future in job.futures:
+            future.set_exception(error)
+        for callback in job.error_callbacks:
+            try:
+                callback(error)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика неудачной отправки в чат {job.chat_id}: {e}", exc_info=True)
+
+    # --- управление ---
+
+    def configure(self, workers: int, global_rate: float, chat_rate: float, group_rate: float) -> None:
+        """Задаёт число потоков и темп отправки (до start; вёдра чатов создаются заново)."""
+        with self._cond:
+            self.workers = workers
+            self.chat_rate = chat_rate
+            self.group_rate = group_rate
+            self._global = TokenBucket(global_rate, max(1, int(global_rate)))
+            self._chat_buckets.clear()
+
+    def start(self) -> "SendQueue":
+        """Запускает потоки отправки (повторный вызов ничего не делает)."""
+        with self._cond:
+            if self._threads:
+                return self
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"send-queue-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Очередь отправки запущена: {self.workers} потоков")
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Отправляет уже поставленные сообщения и останавливает потоки."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self) -> Dict:
+        with self._cond:
+            result = dict(self._counters)
+            result["pending"] = sum(len(q) for q in self._chats.values())
+            result["chats_waiting"] = len(self._waiting)
+        return result
+
+
+# Глобальная очередь отправки процесса
+send_queue = SendQueue()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Выполняющийся вызов, результат которого ждут все участники."""
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых вызовов.
+    Пока выполняется fn для ключа, остальные вызовы с тем же ключом
+    не запускают свою копию, а ждут и получают тот же результат (или то же исключение).
+    После завершения ключ освобождается — следующий вызов выполнится заново.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Выполняет fn один раз на ключ. Возвращает (результат, shared), shared=True у ожидавших."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+            if call.waiters:
+                logger.debug(f"Single-flight '{key}': результат разделён с {call.waiters} ожидавшими")
+
+        return call.result, False
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Выполняется ли сейчас вызов для ключа."""
+        with self._lock:
+            return key in self._calls
+
+
+class AsyncSingleFlight:
+    """
+    То же объединение вызовов для asyncio: одна корутина на ключ,
+    остальные ожидают её результат. Используется внутри одного цикла событий.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Выполняет fn один раз на ключ. Возвращает (результат, shared)."""
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; не даём циклу ругаться на непрочитанную ошибку
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._calls.pop(key, None)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
@@ -0,0 +1,127 @@
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Updater
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передаёт secret_token из setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Обновление Telegram — небольшой JSON; всё крупнее отклоняется без чтения
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer:
+    """
+    Встроенный HTTP-сервер для приёма обновлений через webhook.
+    Каждый POST на path с верным секретом разбирается в Update и кладётся
+    в очередь диспетчера; ответ 200 отправляется сразу, обработка идёт в потоках диспетчера.
+    Встроенный webhook python-telegram-bot 13 не проверяет secret_token, поэтому сервер свой.
+    """
+    def __init__(self, updater: Updater, listen: str, port: int, path: str, secret_token: str):
+        self.updater = updater
+        self.listen = listen
+        self.port = port
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path.split("?", 1)[0] != server.path:
+                    self._respond(404)
+                    return
+                # Сравниваются байты: для str с не-ASCII символами compare_digest бросает TypeError
+                received = self.headers.get(SECRET_HEADER, "").encode("utf-8", "surrogateescape")
+                if not hmac.compare_digest(received, server.secret_token.encode("utf-8")):
+                    server.rejected += 1
+                    logger.warning(f"Webhook: запрос с неверным секретом от {self.client_address[0]}")
+                    self._respond(403)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 < length <= MAX_BODY_SIZE:
+                    self._respond(413 if length > MAX_BODY_SIZE else 400)
+                    return
+                try:
+                    data = json.loads(self.rfile.read(length).decode("utf-8"))
+                    update = Update.de_json(data, server.updater.bot)
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.error(f"Webhook: не удалось разобрать обновление: {e}")
+                    self._respond(400)
+                    return
+                server.received += 1
+                server.updater.update_queue.put(update)
+                self._respond(200)
+
+            def do_GET(self):
+                self._respond(405)
+
+            def _respond(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug("Webhook: " + format % args)
+
+        return Handler
+
+    @property
+    def address(self) -> str:
+        host, port = self._httpd.server_address[:2] if self._httpd else (self.listen, self.port)
+        return f"http://{host}:{port}{self.path}"
+
+    def start(self) -> "WebhookServer":
+        """Запускает сервер в фоновом потоке."""
+        self._httpd = ThreadingHTTPServer((self.listen, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="webhook-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Webhook-сервер слушает {self.address}")
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        logger.info(f"Webhook-сервер остановлен (принято {self.received}, отклонено {self.rejected})")
+
+
+def start_webhook(updater: Updater, listen: str, port: int, path: str,
+                  secret_token: str, public_url: str = "") -> WebhookServer:
+    """
+    Запускает диспетчер и webhook-сервер вместо getUpdates.
+    Если задан public_url, регистрирует его в Telegram вместе с secret_token;
+    иначе webhook должен быть настроен заранее (например, за обратным прокси).
+    """
+    dispatcher_ready = threading.Event()
+    threading.Thread(
+        target=updater.dispatcher.start, kwargs={"ready": dispatcher_ready},
+        name="dispatcher", daemon=True
+    ).start()
+    dispatcher_ready.wait()
+    # Updater.idle() по сигналу останавливает диспетчер штатно только в состоянии running
+    updater.running = True
+
+    server = WebhookServer(updater, listen, port, path, secret_token).start()
+    if public_url:
+        updater.bot.set_webhook(url=public_url, secret_token=secret_token)
+        logger.info(f"Webhook зарегистрирован в Telegram: {public_url}")
+    return server
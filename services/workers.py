@@ -0,0 +1,132 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from typing import Callable, List, Optional
+
+from telegram import Update
+from telegram.ext import Dispatcher
+
+from services.aio import runtime
+from services.send_queue import send_queue
+
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений может ждать в очереди одного рабочего процесса
+WORKER_QUEUE_SIZE = 1000
+# Сколько ждать места в очереди, прежде чем отбросить обновление
+_PUT_TIMEOUT = 5.0
+# Как часто рабочий процесс проверяет, жив ли процесс приёма
+_PARENT_CHECK_INTERVAL = 1.0
+
+
+def shard_key(update: Update) -> int:
+    """
+    Ключ распределения: в группах (отрицательный id чата) — чат, иначе пользователь,
+    иначе чат. Все обновления одного пользователя в личном чате попадают в один процесс,
+    поэтому context.user_data (например, waiting_for) согласован. Все ответы в группу
+    уходят из одного процесса, поэтому его ведро чата соблюдает лимит SEND_GROUP_RATE.
+    """
+    chat = update.effective_chat
+    if chat is not None and chat.id < 0:
+        return chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+def _worker_main(index: int, updates, setup: Callable[[int], Dispatcher], parent_pid: int) -> None:
+    """Точка входа рабочего процесса: свой диспетчер и обработчики, обновления из очереди."""
+    # Остановкой управляет процесс приёма: сигналы терминала и SIGTERM не должны обрывать обработку
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    dispatcher = setup(index)
+    ready = threading.Event()
+    threading.Thread(target=dispatcher.start, kwargs={"ready": ready}, name="dispatcher", daemon=True).start()
+    ready.wait()
+    logger.info(f"Рабочий процесс {index} (pid {os.getpid()}) готов")
+
+    while True:
+        try:
+            raw = updates.get(timeout=_PARENT_CHECK_INTERVAL)
+        except queue.Empty:
+            if os.getppid() != parent_pid:
+                logger.warning(f"Рабочий процесс {index}: процесс приёма завершился, выходим")
+                break
+            continue
+        if raw is None:
+            break
+        try:
+            dispatcher.update_queue.put(Update.de_json(json.loads(raw), dispatcher.bot))
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"Рабочий процесс {index}: не удалось разобрать обновление: {e}")
+
+    dispatcher.stop()
+    runtime.stop()
+    send_queue.stop()
+    logger.info(f"Рабочий процесс {index} остановлен")
+
+
+class WorkerPool:
+    """
+    Несколько процессов-обработчиков за одним процессом приёма обновлений.
+    Процесс приёма (getUpdates или webhook) только распределяет обновления
+    по очередям процессов по shard_key; каждый процесс запускает свой Dispatcher
+    с обычными обработчиками (setup строит его в дочернем процессе), поэтому
+    обработка не упирается в GIL одного интерпретатора.
+    Процессы создаются через spawn: потоки процесса приёма не наследуются.
+    """
+    def __init__(self, workers: int, setup: Callable[[int], Dispatcher], queue_size: int = WORKER_QUEUE_SIZE):
+        self.workers = workers
+        self.setup = setup
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: List = []
+        self._processes: List = []
+
+    def start(self) -> "WorkerPool":
+        for index in range(self.workers):
+            updates = self._context.Queue(maxsize=self.queue_size)
+            process = self._context.Process(
+                target=_worker_main, args=(index, updates, self.setup, os.getpid()),
+                name=f"bot-worker-{index}", daemon=True
+            )
+            process.start()
+            self._queues.append(updates)
+            self._processes.append(process)
+        logger.info(f"Запущено рабочих процессов: {self.workers}")
+        return self
+
+    def shard(self, update: Update) -> int:
+        return shard_key(update) % self.workers
+
+    def dispatch(self, update: Update, context: Optional[object] = None) -> None:
+        """Передаёт обновление своему процессу (подходит как callback обработчика диспетчера)."""
+        index = self.shard(update)
+        try:
+            self._queues[index].put(update.to_json(), timeout=_PUT_TIMEOUT)
+        except queue.Full:
+            self.dropped += 1
+            logger.error(f"Очередь рабочего процесса {index} переполнена, обновление {update.update_id} отброшено")
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Просит процессы доработать очередь и завершиться; зависшие завершаются принудительно."""
+        for updates in self._queues:
+            try:
+                updates.put(None, timeout=_PUT_TIMEOUT)
+            except queue.Full:
+                pass
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} не завершился за {timeout} с, останавливаем принудительно")
+                process.terminate()
+        self._queues = []
+        self._processes = []
@@ -14,10 +14,9 @@ for country in test_countries:
     print(f"\nПоиск страны: {country}")
     result = fetch_country_by_name(country)
     if result:
-        name = result.get("name", {}).get("common", "Unknown")
-        print(f"✅ Найдено: {name}")
-        print(f"   Население: {result.get('population', 0):,}")
-        print(f"   Площадь: {result.get('area', 0):,}")
+        print(f"✅ Найдено: {result.name}")
+        print(f"   Население: {result.population or 0:,}")
+        print(f"   Площадь: {result.area or 0:,}")
     else:
         print(f"❌ Не найдено: {country}")
 
@@ -29,13 +28,13 @@ germany = fetch_country_by_name("Germany")
 
 if russia and germany:
     print("✅ Обе страны найдены!")
-    print(f"Russia: {russia.get('name', {}).get('common')}")
-    print(f"Germany: {germany.get('name', {}).get('common')}")
+    print(f"Russia: {russia.name}")
+    print(f"Germany: {germany.name}")
 
-    pop1 = russia.get("population", 0)
-    pop2 = germany.get("population", 0)
-    area1 = russia.get("area", 0)
-    area2 = germany.get("area", 0)
+    pop1 = russia.population or 0
+    pop2 = germany.population or 0
+    area1 = russia.area or 0
+    area2 = germany.area or 0
 
     print(f"\nСравнение:")
     print(f"Население: {pop1:,} vs {pop2:,}")
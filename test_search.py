@@ -0,0 +1,60 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from services import restcountries
+from services.restcountries import fetch_country_by_name, fetch_countries_by_names
+
+# API заменён заглушкой: запоминаем запросы и имитируем недоступность сети
+api_calls = []
+
+
+def offline_get(path, **kwargs):
+    api_calls.append(path)
+    raise requests.exceptions.ConnectionError("API отключён в тесте")
+
+
+def main() -> int:
+    print("Тестирование локального поиска стран...")
+    restcountries.api_client.get = offline_get
+    failed = False
+
+    # Опечатка исправляется локально, без обращения к API
+    api_calls.clear()
+    result = fetch_country_by_name("Germny")
+    if result and result.name == "Germany" and not api_calls:
+        print("✅ Germny -> Germany (локально)")
+    else:
+        print(f"❌ Germny: {result}, запросы к API: {api_calls}")
+        failed = True
+
+    # Ни префикс, ни похожее название не должны подменять другую страну: решает API
+    for query, wrong in (("Niger", "Nigeria"), ("Austria", "Australia")):
+        api_calls.clear()
+        result = fetch_country_by_name(query)
+        if result is not None and result.name == wrong:
+            print(f"❌ {query} подменена на {wrong}")
+            failed = True
+        elif result is None and not api_calls:
+            print(f"❌ {query}: не найдена без обращения к API")
+            failed = True
+        else:
+            print(f"✅ {query}: {result.name if result else 'API запрошен'}")
+
+    api_calls.clear()
+    results = fetch_countries_by_names(["Portugal", "Sweden"])
+    if all(r is not None for r in results) or len(api_calls) == sum(r is None for r in results):
+        print(f"✅ Portugal, Sweden: {[r.name if r else None for r in results]}, запросов к API: {len(api_calls)}")
+    else:
+        print(f"❌ Portugal, Sweden: {results}, запросы к API: {api_calls}")
+        failed = True
+
+    print("\nТест завершен!" if not failed else "\nТест завершен с ошибками!")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import json
+import sys
+import zlib
+from typing import Dict, Optional, Tuple
+
+
+def _intern(value) -> str:
+    return sys.intern(value) if isinstance(value, str) else ""
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class Country:
+    """
+    Компактная запись о стране.
+    Хранит только поля, которые нужны боту; повторяющиеся строки (регионы, языки,
+    валюты, коды) интернированы и общие для всех записей. Исходный JSON из
+    REST Countries (nativeName, описания флагов и т. п.) хранится сжатым
+    и разворачивается только по запросу через raw.
+    """
+    __slots__ = (
+        "name", "official_name", "cca2", "cca3", "alt_spellings",
+        "capital", "region", "subregion", "population", "area",
+        "languages", "currencies", "flag", "_packed",
+    )
+
+    def __init__(self, name: str, official_name: str = "", cca2: str = "", cca3: str = "",
+                 alt_spellings: Tuple[str, ...] = (), capital: Tuple[str, ...] = (),
+                 region: str = "", subregion: str = "", population: Optional[int] = None,
+                 area: Optional[float] = None, languages: Tuple[str, ...] = (),
+                 currencies: Tuple[Tuple[str, str], ...] = (), flag: str = "",
+                 packed: Optional[bytes] = None):
+        self.name = name
+        self.official_name = official_name
+        self.cca2 = cca2
+        self.cca3 = cca3
+        self.alt_spellings = alt_spellings
+        self.capital = capital
+        self.region = region
+        self.subregion = subregion
+        self.population = population
+        self.area = area
+        self.languages = languages
+        self.currencies = currencies
+        self.flag = flag
+        self._packed = packed
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Country":
+        """Запись из объекта в формате REST Countries v3.1."""
+        name = data.get("name")
+        if isinstance(name, dict):
+            common, official = name.get("common"), name.get("official")
+        else:
+            common, official = name, None
+
+        currencies = data.get("currencies")
+        flags = data.get("flags")
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        return cls(
+            name=_intern(common) or "Unknown",
+            official_name=_intern(official),
+            cca2=_intern(data.get("cca2")),
+            cca3=_intern(data.get("cca3")),
+            alt_spellings=tuple(_intern(s) for s in data.get("altSpellings") or () if isinstance(s, str)),
+            capital=tuple(_intern(c) for c in data.get("capital") or () if isinstance(c, str)),
+            region=_intern(data.get("region")),
+            subregion=_intern(data.get("subregion")),
+            population=_number(data.get("population")),
+            area=_number(data.get("area")),
+            languages=tuple(_intern(v) for v in (data.get("languages") or {}).values()),
+            currencies=tuple(
+                (_intern(code), _intern(info.get("name") if isinstance(info, dict) else None))
+                for code, info in (currencies.items() if isinstance(currencies, dict) else ())
+            ),
+            flag=(flags.get("png") or "") if isinstance(flags, dict) else "",
+            packed=zlib.compress(payload),
+        )
+
+    @property
+    def raw(self) -> Dict:
+        """Исходный объект API (каждый вызов возвращает новую копию)."""
+        if self._packed is None:
+            return {"name": {"common": self.name, "official": self.official_name}}
+        return json.loads(zlib.decompress(self._packed).decode('utf-8'))
+
+    def __repr__(self) -> str:
+        return f"Country({self.name!r})"
@@ -1,34 +1,30 @@
 import logging
-import pandas as pd
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from utils.country import Country
 
 logger = logging.getLogger(__name__)
 
 
-def format_country_info(data: Dict) -> str:
+def _render_country_info(country: Country) -> str:
     try:
-        name = data.get("name", {}).get("common", "—")
-        capital = ", ".join(data.get("capital", ["—"]))
-        population = data.get("population", "—")
-        area = data.get("area", "—")
-        region = data.get("region", "—")
-        subregion = data.get("subregion", "—")
+        name = country.name or "—"
+        capital = ", ".join(country.capital) or "—"
+        region = country.region or "—"
+        subregion = country.subregion or "—"
 
         # Языки
-        languages_dict = data.get("languages") or {}
-        languages = ", ".join(languages_dict.values()) if languages_dict else "—"
+        languages = ", ".join(country.languages) or "—"
 
         # Валюты
-        currencies_dict = data.get("currencies") or {}
-        currencies = ", ".join(
-            f"{v.get('name')} ({k})" for k, v in currencies_dict.items()
-        ) if currencies_dict else "—"
+        currencies = ", ".join(f"{title} ({code})" for code, title in country.currencies) or "—"
 
         # Флаг
-        flag = data.get("flags", {}).get("png", "")
+        flag = country.flag
 
-        pop_str = f"{population:,}".replace(",", "_") if population != "—" else "—"
-        area_str = f"{area:,}".replace(",", "_") if area != "—" else "—"
+        population, area = country.population, country.area
+        pop_str = f"{population:,}".replace(",", "_") if population is not None else "—"
+        area_str = f"{area:,}".replace(",", "_") if area is not None else "—"
 
         return (
             f"{name}\n\n"
@@ -45,38 +41,125 @@ def format_country_info(data: Dict) -> str:
         return "❌ Ошибка при получении данных о стране."
 
 
-def build_top_df(all_countries: List[Dict]) -> pd.DataFrame:
-    rows = []
-    if not all_countries:
-        return pd.DataFrame(columns=["name", "population", "area"])
-
-    for c in all_countries:
-        try:
-            name_data = c.get("name", {})
-            name = name_data.get("common", "Unknown") if isinstance(name_data, dict) else str(name_data)
-
-            population = c.get("population")
-            try:
-                population = int(population) if population is not None else 0
-            except (ValueError, TypeError):
-                population = 0
-
-            area = c.get("area")
-            try:
-                area = float(area) if area is not None else 0.0
-            except (ValueError, TypeError):
-                area = 0.0
-
-            rows.append({
-                "name": name,
-                "population": population,
-                "area": area,
-            })
-        except Exception as e:
-            logger.warning(f"Ошибка при обработке страны для DataFrame: {e}")
-            continue
-
-    if not rows:
-        return pd.DataFrame(columns=["name", "population", "area"])
-
-    return pd.DataFrame(rows)
\ No newline at end of file
+RANDOM_COUNTRY_TITLE = "🎲 *Случайная страна:*\n\n"
+
+# Готовые карточки стран текущего набора: id(записи) -> (запись, карточка, карточка для /random).
+# Запись хранится рядом с текстом, поэтому её id не может достаться другому объекту;
+# записи неизменяемы, так что текст не устаревает, пока запись в наборе.
+_country_info_cache: Dict[int, Tuple[Country, str, str]] = {}
+
+
+def _cached_entry(country: Country) -> Optional[Tuple[Country, str, str]]:
+    entry = _country_info_cache.get(id(country))
+    return entry if entry is not None and entry[0] is country else None
+
+
+def format_country_info(country: Country) -> str:
+    """Карточка страны; для стран текущего набора — готовый текст из кэша."""
+    entry = _cached_entry(country)
+    return entry[1] if entry else _render_country_info(country)
+
+
+def format_random_country(country: Country) -> str:
+    """Карточка страны с заголовком /random (Markdown)."""
+    entry = _cached_entry(country)
+    return entry[2] if entry else RANDOM_COUNTRY_TITLE + _render_country_info(country)
+
+
+def precompute_country_info(countries: List[Country]) -> None:
+    """
+    Заранее форматирует карточки всех стран набора (вызывается при каждой загрузке данных).
+    Тексты неизменившихся записей переиспользуются, карточки исчезнувших стран удаляются.
+    """
+    global _country_info_cache
+    old = _country_info_cache
+    cache: Dict[int, Tuple[Country, str, str]] = {}
+    for country in countries:
+        entry = old.get(id(country))
+        if entry is None or entry[0] is not country:
+            info = _render_country_info(country)
+            entry = (country, info, RANDOM_COUNTRY_TITLE + info)
+        cache[id(country)] = entry
+    _country_info_cache = cache
+
+
+def format_comparison(countries: List[Country], queries: List[str]) -> str:
+    """
+    Таблица сравнения нескольких стран (Markdown, моноширинный блок).
+    queries — исходные запросы, используются как запасные названия.
+    """
+    names = [c.name or q for c, q in zip(countries, queries)]
+    populations = [int(c.population or 0) for c in countries]
+    areas = [float(c.area or 0) for c in countries]
+
+    if len(names) == 2:
+        title = f"📊 Сравнение {names[0]} и {names[1]}"
+    else:
+        title = f"📊 Сравнение стран ({len(names)})"
+
+    # Имена обрезаются, чтобы таблица не переносилась на узких экранах
+    rows = [(name[:16].replace("`", "'"), f"{pop:,}".replace(",", "_"), f"{area:,.0f}".replace(",", "_"))
+            for name, pop, area in zip(names, populations, areas)]
+    header = ("Страна", "Население", "Площадь, км²")
+    widths = [max(len(row[i]) for row in rows + [header]) for i in range(3)]
+
+    lines = [
+        f"{header[0]:<{widths[0]}}  {header[1]:>{widths[1]}}  {header[2]:>{widths[2]}}",
+        "-" * (sum(widths) + 4),
+    ]
+    for name, pop, area in rows:
+        lines.append(f"{name:<{widths[0]}}  {pop:>{widths[1]}}  {area:>{widths[2]}}")
+
+    leaders = (
+        f"👥 Больше всего жителей: {names[populations.index(max(populations))]}\n"
+        f"📏 Самая большая площадь: {names[areas.index(max(areas))]}"
+    )
+    return f"{title}\n\n```\n" + "\n".join(lines) + f"\n```\n{leaders}"
+
+
+# Названия метрик в заголовке топа и форматы значений
+TOP_METRIC_NAMES = {
+    "population": "населению",
+    "area": "площади",
+    "density": "плотности населения (чел/км²)",
+}
+_TOP_VALUE_FORMATS = {
+    "population": "{:,.0f}",
+    "area": "{:,.1f}",
+    "density": "{:,.1f}",
+}
+
+# Готовые тексты топов для текущей версии данных: (метрика, N, регион) -> текст
+_top_text_cache: Dict[Tuple[str, int, Optional[str]], str] = {}
+_top_text_version: Optional[int] = None
+
+
+def format_top(rows: List[Tuple[str, float]], metric: str, n: int, version: Optional[int] = None,
+               region: Optional[str] = None) -> str:
+    """
+    Текст топа из готовых строк рейтинга (название, значение).
+    Если передана версия данных, результат запоминается до её смены.
+    """
+    global _top_text_version
+
+    if version is not None:
+        # Тексты прошлых версий данных больше не понадобятся
+        if version != _top_text_version:
+            _top_text_cache.clear()
+            _top_text_version = version
+        text = _top_text_cache.get((metric, n, region))
+        if text is not None:
+            return text
+
+    text = f"🏆 Топ {n} стран по {TOP_METRIC_NAMES.get(metric, metric)}"
+    text += f" — {region}\n\n" if region else "\n\n"
+
+    medals = ["🥇", "🥈", "🥉"]
+    value_format = _TOP_VALUE_FORMATS.get(metric, "{:,}")
+    for i, (name, value) in enumerate(rows):
+        medal = medals[i] if i < 3 else f"{i + 1}."
+        text += f"{medal} {name}: {value_format.format(value).replace(',', '_')}\n"
+
+    if version is not None:
+        _top_text_cache[(metric, n, region)] = text
+    return text
@@ -0,0 +1,224 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from utils.country import Country
+from utils.storage import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+# Двоичный снимок набора стран.
+#
+# Файл состоит из заголовка, таблицы разделов и самих разделов (каждый выровнен по 8 байт):
+#   str_offsets  uint32[S + 1]  — границы строк в str_data
+#   str_data     UTF-8          — все различные строки набора, каждая один раз
+#   fields       int32[N * 15]  — на страну: 7 номеров строк и 4 пары (начало, длина) в list_items
+#   list_items   int32[]        — номера строк для списков (альтернативные названия, столицы,
+#                                 языки, пары «код валюты, название»)
+#   population   int64[N]       — население (-1 — нет данных)
+#   area         float64[N]     — площадь (NaN — нет данных)
+#   raw_offsets  uint64[N + 1]  — границы сжатого исходного JSON каждой страны в raw_data
+#   raw_data     bytes
+# Числа записываются в порядке байт машины; файл другой архитектуры просто пересоздаётся.
+# Файл читается через mmap. Сжатый JSON каждой страны и колонки population и area
+# (по ним строится таблица рейтингов, см. SnapshotCountries) не копируются в память процесса:
+# страницы файла общие для всех процессов бота. Строки и записи Country у каждого процесса свои.
+
+MAGIC = b"CTRYSNAP"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8s2sxxIIQq")
+_SECTIONS = ("str_offsets", "str_data", "fields", "list_items",
+             "population", "area", "raw_offsets", "raw_data")
+_SECTION_TABLE = struct.Struct("<" + "QQ" * len(_SECTIONS))
+_BYTEORDER = b"le" if sys.byteorder == "little" else b"be"
+
+_STRING_FIELDS = ("name", "official_name", "cca2", "cca3", "region", "subregion", "flag")
+_LIST_FIELDS = ("alt_spellings", "capital", "languages", "currencies")
+_FIELDS_PER_COUNTRY = len(_STRING_FIELDS) + 2 * len(_LIST_FIELDS)
+
+# Ключ источника: размер и время изменения JSON-файла
+SourceKey = Tuple[int, int]
+
+
+def source_key(path: str) -> Optional[SourceKey]:
+    """Размер и время изменения (нс) файла-источника или None, если файла нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class SnapshotCountries(list):
+    """
+    Список стран, прочитанный из снимка. columns — разделы population (int64, -1 — нет данных)
+    и area (float64, NaN — нет данных) как memoryview поверх mmap в порядке стран списка;
+    CountryTable.from_snapshot строит по ним колонки без копирования.
+    """
+    def __init__(self, countries: List[Country], columns: Dict[str, memoryview]):
+        super().__init__(countries)
+        self.columns = columns
+
+
+def _align(buf: bytearray) -> None:
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def write_snapshot(path: str, countries: List[Country], source: SourceKey) -> None:
+    """Атомарно записывает снимок набора стран, собранного из файла с ключом source."""
+    strings: Dict[str, int] = {"": 0}
+
+    def sid(value: str) -> int:
+        return strings.setdefault(value or "", len(strings))
+
+    fields = array("i")
+    list_items = array("i")
+    population = array("q")
+    area = array("d")
+    raw_offsets = array("Q", [0])
+    raw_data = bytearray()
+
+    for country in countries:
+        fields.extend(sid(getattr(country, name)) for name in _STRING_FIELDS)
+        for name in _LIST_FIELDS:
+            values = getattr(country, name)
+            start = len(list_items)
+            if name == "currencies":
+                for code, title in values:
+                    list_items.extend((sid(code), sid(title)))
+            else:
+                list_items.extend(sid(v) for v in values)
+            fields.extend((start, len(values)))
+        population.append(country.population if country.population is not None else -1)
+        area.append(float(country.area) if country.area is not None else math.nan)
+        raw_data.extend(country._packed or b"")
+        raw_offsets.append(len(raw_data))
+
+    str_data = bytearray()
+    str_offsets = array("I", [0])
+    for value in strings:  # словарь хранит порядок вставки = номера строк
+        str_data.extend(value.encode("utf-8"))
+        str_offsets.append(len(str_data))
+
+    sections = {
+        "str_offsets": str_offsets.tobytes(),
+        "str_data": bytes(str_data),
+        "fields": fields.tobytes(),
+        "list_items": list_items.tobytes(),
+        "population": population.tobytes(),
+        "area": area.tobytes(),
+        "raw_offsets": raw_offsets.tobytes(),
+        "raw_data": bytes(raw_data),
+    }
+
+    body = bytearray(b"\0" * (_HEADER.size + _SECTION_TABLE.size))
+    _align(body)
+    table = []
+    for name in _SECTIONS:
+        data = sections[name]
+        table.extend((len(body), len(data)))
+        body.extend(data)
+        _align(body)
+
+    _HEADER.pack_into(body, 0, MAGIC, _BYTEORDER, FORMAT_VERSION, len(countries), *source)
+    _SECTION_TABLE.pack_into(body, _HEADER.size, *table)
+    atomic_write_bytes(path, bytes(body))
+    logger.info(f"Двоичный снимок стран записан: {path} ({len(countries)} стран, {len(body)} байт)")
+
+
+def snapshot_matches(path: str, source: Optional[SourceKey]) -> bool:
+    """Есть ли снимок текущего формата, собранный из источника с ключом source (читается только заголовок)."""
+    if source is None:
+        return False
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        magic, byteorder, version, _, size, mtime_ns = _HEADER.unpack(header)
+    except (OSError, struct.error):
+        return False
+    return (magic, byteorder, version) == (MAGIC, _BYTEORDER, FORMAT_VERSION) and (size, mtime_ns) == tuple(source)
+
+
+def read_snapshot(path: str, source: Optional[SourceKey] = None) -> Optional[SnapshotCountries]:
+    """
+    Загружает страны из снимка через mmap.
+    Возвращает None, если файла нет, он повреждён, другого формата
+    или собран не из источника с ключом source (тогда снимок нужно пересоздать).
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, byteorder, version, count, size, mtime_ns = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or byteorder != _BYTEORDER or version != FORMAT_VERSION:
+            return None
+        if source is not None and (size, mtime_ns) != tuple(source):
+            return None
+
+        table = _SECTION_TABLE.unpack_from(mm, _HEADER.size)
+        view = memoryview(mm)
+        sections = {}
+        for i, name in enumerate(_SECTIONS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            if offset + length > len(mm):
+                return None
+            sections[name] = view[offset:offset + length]
+
+        str_offsets = sections["str_offsets"].cast("I")
+        str_data = sections["str_data"]
+        strings = [
+            sys.intern(bytes(str_data[str_offsets[i]:str_offsets[i + 1]]).decode("utf-8"))
+            for i in range(len(str_offsets) - 1)
+        ]
+        fields = sections["fields"].cast("i")
+        items = sections["list_items"].cast("i")
+        population = sections["population"].cast("q")
+        area = sections["area"].cast("d")
+        raw_offsets = sections["raw_offsets"].cast("Q")
+        raw_data = sections["raw_data"]
+
+        countries = []
+        for i in range(count):
+            row = fields[i * _FIELDS_PER_COUNTRY:(i + 1) * _FIELDS_PER_COUNTRY]
+            name, official, cca2, cca3, region, subregion, flag = (strings[j] for j in row[:7])
+            lists = []
+            for k in range(len(_LIST_FIELDS)):
+                start, length = row[7 + 2 * k], row[8 + 2 * k]
+                if _LIST_FIELDS[k] == "currencies":
+                    values = tuple(
+                        (strings[items[start + 2 * j]], strings[items[start + 2 * j + 1]])
+                        for j in range(length)
+                    )
+                else:
+                    values = tuple(strings[items[j]] for j in range(start, start + length))
+                lists.append(values)
+            alt_spellings, capital, languages, currencies = lists
+
+            pop = population[i]
+            country_area = area[i]
+            countries.append(Country(
+                name=name, official_name=official, cca2=cca2, cca3=cca3,
+                alt_spellings=alt_spellings, capital=capital,
+                region=region, subregion=subregion,
+                population=pop if pop >= 0 else None,
+                area=country_area if not math.isnan(country_area) else None,
+                languages=languages, currencies=currencies, flag=flag,
+                # Срез memoryview ссылается на mmap: сжатый JSON остаётся в общих страницах файла
+                packed=raw_data[raw_offsets[i]:raw_offsets[i + 1]] or None,
+            ))
+        return SnapshotCountries(countries, {
+            "population": sections["population"],
+            "area": sections["area"],
+        })
+
+    except (struct.error, ValueError, TypeError, IndexError, UnicodeDecodeError) as e:
+        logger.error(f"Двоичный снимок стран {path} повреждён: {e}")
+        return None
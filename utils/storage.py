@@ -0,0 +1,36 @@
+import json
+import os
+import tempfile
+from typing import Any
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """
+    Записывает файл атомарно: во временный файл в той же папке, fsync и rename.
+    При сбое посреди записи на диске остаётся прежняя версия файла.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path: str, text: str) -> None:
+    """Атомарно записывает текст в UTF-8 (см. atomic_write_bytes)."""
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """Атомарно сохраняет данные в компактном JSON."""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
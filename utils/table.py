@@ -0,0 +1,119 @@
+import logging
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.country import Country
+
+logger = logging.getLogger(__name__)
+
+# Числовые колонки таблицы
+NUMERIC_COLUMNS = ("population", "area", "density")
+
+
+def _to_number(value, cast, default):
+    try:
+        return cast(value) if value is not None else default
+    except (ValueError, TypeError):
+        return default
+
+
+def _shown(value):
+    """Отсутствующее значение из снимка (-1 или NaN) показывается как 0, как в from_countries."""
+    return value if value == value and value >= 0 else type(value)(0)
+
+
+class CountryTable:
+    """
+    Колоночное представление набора стран для рейтингов и агрегатов.
+    Строится один раз при загрузке данных: числовые показатели — массивы NumPy,
+    названия и регионы — интернированные строки, регион дополнительно закодирован
+    номером категории. Порядок сортировки по каждой метрике вычисляется сразу,
+    поэтому топ без фильтров — срез готового индекса, а с фильтром — argpartition
+    по маске.
+    """
+    def __init__(self, names: List[str], regions: List[str],
+                 population: np.ndarray, area: np.ndarray):
+        self.names = np.array([sys.intern(n) for n in names], dtype=object)
+        self.region_names: List[str] = sorted({sys.intern(r) for r in regions})
+        region_ids = {r: i for i, r in enumerate(self.region_names)}
+        self.region_codes = np.array([region_ids[r] for r in regions], dtype=np.int16)
+
+        self.columns: Dict[str, np.ndarray] = {
+            "population": population.astype(np.int64, copy=False),
+            "area": area.astype(np.float64, copy=False),
+        }
+        with np.errstate(divide="ignore", invalid="ignore"):
+            density = np.where((area > 0) & (population > 0), population / np.where(area > 0, area, 1), 0.0)
+        self.columns["density"] = density
+
+        # Индексы строк по убыванию каждой метрики; stable сохраняет исходный порядок при равенстве
+        self._order: Dict[str, np.ndarray] = {
+            metric: np.argsort(-values, kind="stable") for metric, values in self.columns.items()
+        }
+
+    @classmethod
+    def from_countries(cls, countries: List[Country]) -> "CountryTable":
+        """Строит таблицу из записей Country."""
+        names, regions, population, area = [], [], [], []
+        for c in countries or []:
+            names.append(c.name)
+            regions.append(c.region or "—")
+            population.append(_to_number(c.population, int, 0))
+            area.append(_to_number(c.area, float, 0.0))
+        return cls(names, regions, np.array(population, dtype=np.int64), np.array(area, dtype=np.float64))
+
+    @classmethod
+    def from_snapshot(cls, countries: List[Country], columns: Dict[str, memoryview]) -> "CountryTable":
+        """
+        Строит таблицу по странам двоичного снимка (utils.snapshot.SnapshotCountries):
+        колонки population и area — массивы поверх mmap-файла, без копирования.
+        Отсутствующие данные там записаны как -1 и NaN и при сортировке оказываются в конце.
+        """
+        population = np.frombuffer(columns["population"], dtype=np.int64)
+        area = np.frombuffer(columns["area"], dtype=np.float64)
+        if len(population) != len(countries) or len(area) != len(countries):
+            return cls.from_countries(countries)
+        return cls([c.name for c in countries], [c.region or "—" for c in countries], population, area)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def region_mask(self, region: str) -> Optional[np.ndarray]:
+        """Маска строк региона (без учёта регистра) или None, если такого региона нет."""
+        wanted = region.casefold()
+        for code, name in enumerate(self.region_names):
+            if name.casefold() == wanted:
+                return self.region_codes == code
+        return None
+
+    def top_indices(self, metric: str, n: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Номера строк первых n стран по убыванию метрики, с необязательным фильтром."""
+        if mask is None:
+            return self._order[metric][:n]
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return candidates
+        values = self.columns[metric][candidates]
+        if n < len(candidates):
+            # Частичный отбор O(len) и сортировка только выбранных n
+            part = np.argpartition(-values, n - 1)[:n]
+            part = part[np.argsort(-values[part], kind="stable")]
+        else:
+            part = np.argsort(-values, kind="stable")
+        return candidates[part]
+
+    def top(self, metric: str, n: int, region: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Первые n стран по метрике: список (название, значение)."""
+        if metric not in self.columns or n <= 0:
+            return []
+        mask = None
+        if region:
+            mask = self.region_mask(region)
+            if mask is None:
+                return []
+        indices = self.top_indices(metric, n, mask)
+        values = self.columns[metric][indices]
+        return [(self.names[i], _shown(v.item())) for i, v in zip(indices, values)]